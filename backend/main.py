@@ -3,54 +3,172 @@ FastAPI Backend - Radar de Preço & CMV
 Main application with REST API endpoints.
 """
 
+import asyncio
+import hashlib
 import os
 import uuid
 from contextlib import asynccontextmanager
-from datetime import datetime, timezone
+from datetime import datetime
 from decimal import Decimal
-from typing import List, Optional
+from typing import BinaryIO, List, Optional
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import anyio
+import httpx
+import numpy as np
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, field_serializer
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from postgrest.utils import SyncClient
 
 # Import tools
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from tools.ocr_processor import ocr_from_bytes
+from tools.ocr_processor import ocr_from_bytes, MockReceiptText
 from tools.receipt_parser import parse_receipt
-from tools.cmv_calculator import recalculate_affected_recipes, calculate_cmv_change_percentage
-from tools.discord_notifier import send_price_alert, send_cmv_update
+from tools.cmv_calculator import recalculate_affected_recipes, calculate_cmv_change_percentage, is_packaging_category
+from tools.discord_notifier import send_price_alerts, send_cmv_update, MAX_EMBEDS_PER_MESSAGE
 
 from backend.integrations.mercadopago_client import MercadoPagoClient
 from backend.integrations.stripe_client import StripeClient
 from backend.utils.logger import logger
+from backend.utils.cache import TTLCache, cached, MISSING
+from backend.utils.http import RetryTransport, environment_proxy
 
 
 load_dotenv()
 
 # Supabase client (using service_role for backend operations)
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    SUPABASE_SERVICE_KEY
+
+# Sync endpoints, and the blocking calls async endpoints offload (anyio.to_thread),
+# run in AnyIO's threadpool and block on Supabase I/O; size it for that
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "64"))
+
+# Keep PostgREST connections warm between requests (httpx defaults to a 5s idle expiry).
+# Every blocking Supabase call runs on a THREADPOOL_SIZE thread (the async endpoints'
+# SUPABASE_MAX_INFLIGHT calls included), so one connection per thread means threads
+# never queue for a connection.
+SUPABASE_HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("SUPABASE_MAX_CONNECTIONS", str(THREADPOOL_SIZE))),
+    max_keepalive_connections=int(os.getenv("SUPABASE_MAX_KEEPALIVE", str(THREADPOOL_SIZE))),
+    keepalive_expiry=60
 )
 
+# TLS verification and proxy postgrest creates its own session with (supabase-py
+# keeps its defaults). They are set on the transport, which is what applies them.
+POSTGREST_VERIFY = True
+POSTGREST_PROXY = None
+
+
+def create_supabase_client() -> Client:
+    """
+    Create the Supabase client with a long-lived keep-alive pool for PostgREST.
+    Rate-limited (429) calls are retried with backoff by the transport.
+    """
+    client = create_client(os.getenv("SUPABASE_URL"), SUPABASE_SERVICE_KEY)
+    default_session = client.postgrest.session
+    trust_env = default_session.trust_env
+    proxy = POSTGREST_PROXY or (environment_proxy(default_session.base_url) if trust_env else None)
+    client.postgrest.session = SyncClient(
+        base_url=default_session.base_url,
+        headers=default_session.headers,
+        timeout=default_session.timeout,
+        follow_redirects=True,
+        trust_env=trust_env,
+        transport=RetryTransport(
+            http2=True,
+            limits=SUPABASE_HTTP_LIMITS,
+            verify=POSTGREST_VERIFY,
+            proxy=proxy,
+            trust_env=trust_env
+        )
+    )
+    default_session.close()
+    return client
+
+
+supabase: Client = create_supabase_client()
+
+# Short-lived read caches (invalidated on writes)
+ingredients_cache = TTLCache(maxsize=256, ttl=30)
+categories_cache = TTLCache(maxsize=256, ttl=30)
+recipe_categories_cache = TTLCache(maxsize=1, ttl=300)  # no write endpoint; edited in Supabase
+receipts_cache = TTLCache(maxsize=16, ttl=30)
+recipes_cache = TTLCache(maxsize=512, ttl=30)
+product_map_cache = TTLCache(maxsize=10000, ttl=300)  # ~distinct receipt names seen per day
+ingredient_cost_cache = TTLCache(maxsize=1024, ttl=5)
+nutritional_ref_cache = TTLCache(maxsize=10000, ttl=3600)  # reference tables rarely change
+ocr_text_cache = TTLCache(maxsize=64, ttl=600)  # sha256(image) -> OCR text, for re-uploads
+health_cache = TTLCache(maxsize=1, ttl=3)
+
+
+# Discord alerts are delivered by a background worker, off the request path.
+# Alerts arriving within ALERT_BATCH_WAIT_S are sent as one webhook message.
+ALERT_MAX_CONCURRENCY = 5
+ALERT_DRAIN_TIMEOUT_S = 10
+ALERT_BATCH_WAIT_S = 2.0
+
+
+async def price_alert_worker(queue: asyncio.Queue):
+    """Drain queued price alerts in batches, posting at most ALERT_MAX_CONCURRENCY batches at a time."""
+    semaphore = asyncio.Semaphore(ALERT_MAX_CONCURRENCY)
+    pending = set()
+    loop = asyncio.get_running_loop()
+    
+    async def deliver(batch: List[dict]):
+        names = [alert["ingredient_name"] for alert in batch]
+        try:
+            async with semaphore:
+                sent = await asyncio.to_thread(send_price_alerts, batch)
+            if sent:
+                logger.info("Price alerts sent", extra={"ingredients": names})
+        except Exception as e:
+            logger.error(f"Price alert failed: {e}", extra={"ingredients": names})
+        finally:
+            for _ in batch:
+                queue.task_done()
+    
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + ALERT_BATCH_WAIT_S
+        while len(batch) < MAX_EMBEDS_PER_MESSAGE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        task = asyncio.create_task(deliver(batch))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events."""
     logger.info("[STARTUP] Backend started - Radar de Preco & CMV")
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    app.state.alert_queue = asyncio.Queue()
+    alert_worker = asyncio.create_task(price_alert_worker(app.state.alert_queue))
     yield
     logger.info("[SHUTDOWN] Backend shutting down")
+    try:
+        await asyncio.wait_for(app.state.alert_queue.join(), timeout=ALERT_DRAIN_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        logger.warning("Dropping undelivered price alerts", extra={"count": app.state.alert_queue.qsize()})
+    alert_worker.cancel()
+    supabase.postgrest.aclose()
 
 
 app = FastAPI(
     title="Radar de Preço & CMV API",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS for Vercel frontend
@@ -62,6 +180,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reference data the UI refetches often: browsers revalidate with If-None-Match
+# and get an empty 304 when nothing changed
+ETAG_PATHS = {"/api/categories", "/api/recipe-categories", "/api/ingredients/pending", "/api/recipes"}
+ETAG_PATH_SUFFIXES = ("/anvisa-label",)
+
+
+def is_etag_path(path: str) -> bool:
+    return path in ETAG_PATHS or path.endswith(ETAG_PATH_SUFFIXES)
+
+
+@app.middleware("http")
+async def etag_middleware(request: Request, call_next):
+    response = await call_next(request)
+    if request.method != "GET" or not is_etag_path(request.url.path) or response.status_code != 200:
+        return response
+    
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    # Keep the original content-type: the streamed response has no media_type to rebuild it from
+    headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+    headers["ETag"] = etag
+    headers["Cache-Control"] = "no-cache"
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, status_code=200, headers=headers)
+
 
 # ============= Pydantic Models =============
 
@@ -79,6 +223,11 @@ class ReceiptItemResponse(BaseModel):
     matched_ingredient_id: Optional[str] = None
     suggested_ingredient: Optional[dict] = None
 
+    # Pydantic emits Decimal as a JSON string; the frontend expects numbers
+    @field_serializer("parsed_price", "quantity")
+    def serialize_decimal(self, value: Optional[Decimal]) -> Optional[float]:
+        return float(value) if value is not None else None
+
 
 class UploadReceiptResponse(BaseModel):
     receipt_id: str
@@ -86,6 +235,10 @@ class UploadReceiptResponse(BaseModel):
     total_amount: Optional[Decimal]
     items: List[ReceiptItemResponse]
 
+    @field_serializer("total_amount")
+    def serialize_decimal(self, value: Optional[Decimal]) -> Optional[float]:
+        return float(value) if value is not None else None
+
 
 class ValidateItemInput(BaseModel):
     receipt_item_id: str
@@ -119,15 +272,160 @@ class AddExpenseRequest(BaseModel):
     record_date: Optional[str] = None
 
 
+# ============= Helpers =============
+
+# Column projections for list endpoints (what the frontend actually reads)
+PENDING_RECEIPT_COLUMNS = (
+    "id, market_name, total_amount, status, created_at, "
+    "receipt_items(id, raw_name, parsed_price, quantity, matched_ingredient_id)"
+)
+RECIPE_LIST_COLUMNS = (
+    "id, product_id, category_id, name, yield_units, labor_minutes, labor_cost, "
+    "ingredients_cost, packaging_cost, sku, current_cost, total_weight_kg, "
+    "cmv_per_unit, cmv_per_kg, is_pre_preparo, derived_ingredient_id, "
+    "production_unit, net_weight, sauce_yield_kg, status, last_calculated"
+)
+
+# Receipt uploads
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "10")) * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# OCR is CPU-bound; cap concurrent jobs and shed load when the queue is too long
+OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", "2"))
+OCR_QUEUE_TIMEOUT_S = float(os.getenv("OCR_QUEUE_TIMEOUT_S", "30"))
+ocr_semaphore = asyncio.Semaphore(OCR_CONCURRENCY)
+ocr_inflight: dict = {}  # sha256(image) -> running OCR task
+
+
+# Max rows returned by ?search= autocomplete queries
+SEARCH_LIMIT = 50
+MAX_PAGE_SIZE = 200
+MAX_PENDING_INGREDIENTS = 500
+
+# Cap Supabase calls in flight from async endpoints (each holds a worker thread)
+SUPABASE_MAX_INFLIGHT = int(os.getenv("SUPABASE_MAX_INFLIGHT", "16"))
+supabase_semaphore = asyncio.Semaphore(SUPABASE_MAX_INFLIGHT)
+
+
+async def execute_async(query):
+    """
+    Run a blocking supabase-py query in a worker thread so async endpoints don't stall the event loop.
+    Uses AnyIO's threadpool (THREADPOOL_SIZE), shared with the sync endpoints.
+    """
+    async with supabase_semaphore:
+        return await anyio.to_thread.run_sync(query.execute)
+
+
+def read_upload(fileobj: BinaryIO) -> tuple:
+    """
+    Return (contents, sha256 hex digest) of an uploaded file, reading it in chunks.
+    Stops early once MAX_UPLOAD_BYTES is exceeded (contents is then truncated).
+    """
+    digest = hashlib.sha256()
+    contents = bytearray()
+    fileobj.seek(0)
+    while chunk := fileobj.read(UPLOAD_CHUNK_BYTES):
+        digest.update(chunk)
+        contents += chunk
+        if len(contents) > MAX_UPLOAD_BYTES:
+            break
+    return bytes(contents), digest.hexdigest()
+
+
+async def run_ocr(contents: bytes, key: str) -> str:
+    """
+    Run OCR for an upload, keyed by its content hash. Concurrent uploads of the
+    same image (double submits, client retries) share a single OCR job instead
+    of each paying for Tesseract, and re-uploads within ocr_text_cache's TTL
+    reuse the text. The job gets the image bytes rather than the upload's file,
+    which Starlette closes when the request that started the job ends.
+    """
+    text = ocr_text_cache.get(key)
+    if text is not None:
+        return text
+    
+    task = ocr_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(ocr_job(contents))
+        ocr_inflight[key] = task
+        task.add_done_callback(lambda _: ocr_inflight.pop(key, None))
+    # Shielded so one client disconnecting doesn't cancel the job for the others
+    text = await asyncio.shield(task)
+    # The mock receipt returned when OCR fails is not cached, so a re-upload retries OCR
+    if not isinstance(text, MockReceiptText):
+        ocr_text_cache.set(key, text)
+    return text
+
+
+async def ocr_job(contents: bytes) -> str:
+    """Run OCR in a worker thread, at most OCR_CONCURRENCY at a time (503 if the wait times out)."""
+    try:
+        await asyncio.wait_for(ocr_semaphore.acquire(), timeout=OCR_QUEUE_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        raise HTTPException(503, "OCR busy - try again shortly")
+    try:
+        return await anyio.to_thread.run_sync(ocr_from_bytes, contents)
+    finally:
+        ocr_semaphore.release()
+
+
+def product_map_key(name: str) -> str:
+    """Exact-match cache key for a receipt name: lowercased, whitespace collapsed."""
+    return " ".join(name.split()).lower()
+
+
+async def match_product_names(name_keys: List[str]) -> dict:
+    """
+    Match receipt item names against product_map (cached) in a single round-trip.
+    Names sharing a product_map_key share one cache entry and one match: the RPC is
+    sent the first such name as written (stripped), since its ILIKE substring match
+    depends on internal whitespace. Returns {name: match} for the given names.
+    """
+    normalized = {name: product_map_key(name) for name in set(name_keys)}
+    found = {}
+    uncached = {}  # key -> name sent to match_product_map
+    for name in name_keys:
+        key = normalized[name]
+        if key in found or key in uncached:
+            continue
+        match = product_map_cache.get(key, MISSING)
+        if match is MISSING:
+            uncached[key] = name.strip()
+        else:
+            found[key] = match
+    
+    if uncached:
+        match_response = await execute_async(supabase.rpc("match_product_map", {"p_names": list(uncached.values())}))
+        matched = {
+            m["query_name"]: {
+                "id": m["ingredient_id"],
+                "name": m["ingredient_name"],
+                "category": m["category"]
+            }
+            for m in (match_response.data or [])
+        }
+        for key, query_name in uncached.items():
+            found[key] = matched.get(query_name)
+            product_map_cache.set(key, found[key])
+    logger.debug("product_map cache", extra=product_map_cache.stats())
+    return {name: found[key] for name, key in normalized.items()}
+
+
 # ============= Endpoints =============
 
 @app.get("/api/health")
 def health_check():
     """Health check for Docker/Uptime monitors."""
+    cached_status = health_cache.get("health")
+    if cached_status:
+        return cached_status
+    
     try:
-        # Simple query to check DB connection
-        supabase.table("ingredients").select("id").limit(1).execute()
-        return {"status": "healthy", "database": "connected"}
+        # Cheap SELECT 1 to check DB connection; only healthy results are cached
+        supabase.rpc("ping").execute()
+        status = {"status": "healthy", "database": "connected"}
+        health_cache.set("health", status)
+        return status
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         raise HTTPException(503, f"Service unhealthy: {str(e)}")
@@ -154,11 +452,16 @@ async def upload_receipt(file: UploadFile = File(...)):
     logger.info(f"Starting receipt upload processing", extra={"request_id": request_id, "file_name": file.filename})
     
     try:
-        # Read image
-        contents = await file.read()
+        # Reject oversized uploads before doing any work
+        if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+            raise HTTPException(413, f"File too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
+        
+        contents, digest = await anyio.to_thread.run_sync(read_upload, file.file)
+        if len(contents) > MAX_UPLOAD_BYTES:
+            raise HTTPException(413, f"File too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
         
         # OCR
-        text = ocr_from_bytes(contents)
+        text = await run_ocr(contents, digest)
         logger.debug(f"OCR Output", extra={"request_id": request_id, "text_length": len(text), "preview": text[:100]})
         
         if not text or len(text) < 20:
@@ -166,7 +469,7 @@ async def upload_receipt(file: UploadFile = File(...)):
             raise HTTPException(400, "OCR failed - no text detected")
         
         # Parse receipt
-        parsed = parse_receipt(text)
+        parsed = await anyio.to_thread.run_sync(parse_receipt, text)
         logger.info("Receipt parsed successfully", extra={"request_id": request_id, "market": parsed.get("market_name")})
         
         # Create receipt record
@@ -176,57 +479,51 @@ async def upload_receipt(file: UploadFile = File(...)):
             "status": "pending_validation"
         }
         
-        receipt_response = supabase.table("receipts").insert(receipt_data).execute()
+        # Receipt insert and product_map matching are independent: run them concurrently
+        name_keys = [item["raw_name"][:20] for item in parsed["items"]]
+        receipt_response, matches = await asyncio.gather(
+            execute_async(supabase.table("receipts").insert(receipt_data)),
+            match_product_names(name_keys)
+        )
         receipt_id = receipt_response.data[0]["id"]
         
-        # Stage items
-        response_items = []
-        for item in parsed["items"]:
-            # Try to find match in product_map
-            matched_ingredient = None
-            product_map_response = supabase.table("product_map") \
-                .select("ingredient_id, ingredients(id, name, category)") \
-                .ilike("raw_name", f"%{item['raw_name'][:20]}%") \
-                .limit(1) \
-                .execute()
-            
-            if product_map_response.data:
-                ingredient_data = product_map_response.data[0]["ingredients"]
-                matched_ingredient = {
-                    "id": ingredient_data["id"],
-                    "name": ingredient_data["name"],
-                    "category": ingredient_data["category"]
-                }
-            
-            # Insert item
-            item_data = {
+        # Stage items (bulk insert)
+        items_to_insert = []
+        for item, key in zip(parsed["items"], name_keys):
+            matched_ingredient = matches.get(key)
+            items_to_insert.append({
                 "receipt_id": receipt_id,
                 "raw_name": item["raw_name"],
                 "parsed_price": float(item["price"]),
                 "quantity": float(item["quantity"]),
                 "matched_ingredient_id": matched_ingredient["id"] if matched_ingredient else None
-            }
-            
-            item_response = supabase.table("receipt_items").insert(item_data).execute()
-            item_record = item_response.data[0]
-            
-            response_items.append(ReceiptItemResponse(
-                id=item_record["id"],
-                raw_name=item_record["raw_name"],
-                parsed_price=Decimal(str(item_record["parsed_price"])),
-                quantity=Decimal(str(item_record["quantity"])),
-                matched_ingredient_id=item_record["matched_ingredient_id"],
-                suggested_ingredient=matched_ingredient
-            ))
+            })
+        
+        inserted_items = []
+        if items_to_insert:
+            items_response = await execute_async(supabase.table("receipt_items").insert(items_to_insert))
+            inserted_items = items_response.data
+        
+        # Plain dicts: FastAPI validates them once against response_model.
+        # Values come from the parser (already Decimal); only the id comes from the DB.
+        response_items = [{
+            "id": item_record["id"],
+            "raw_name": item["raw_name"],
+            "parsed_price": item["price"],
+            "quantity": item["quantity"],
+            "matched_ingredient_id": staged["matched_ingredient_id"],
+            "suggested_ingredient": matches.get(key)
+        } for item_record, staged, item, key in zip(inserted_items, items_to_insert, parsed["items"], name_keys)]
         
+        receipts_cache.clear()
         logger.info(f"Receipt uploaded successfully", extra={"request_id": request_id, "receipt_id": receipt_id, "items_count": len(response_items)})
         
-        return UploadReceiptResponse(
-            receipt_id=receipt_id,
-            market_name=parsed["market_name"],
-            total_amount=parsed["total_amount"],
-            items=response_items
-        )
+        return {
+            "receipt_id": receipt_id,
+            "market_name": parsed["market_name"],
+            "total_amount": parsed["total_amount"],
+            "items": response_items
+        }
         
     except HTTPException:
         raise
@@ -241,11 +538,9 @@ async def validate_receipt(receipt_id: str, payload: ValidateReceiptInput):
     Validate receipt and update ingredient prices.
     
     Flow:
-    1. Update product_map (learning)
-    2. Update ingredient prices
+    1. Update product_map (learning), ingredient prices and receipt status (single RPC)
+    2. Send Discord alerts if needed
     3. Recalculate affected recipes
-    4. Send Discord alerts if needed
-    5. Mark receipt as verified
     """
     request_id = str(uuid.uuid4())
     logger.info(f"Starting receipt validation", extra={"request_id": request_id, "receipt_id": receipt_id, "items_count": len(payload.items)})
@@ -254,69 +549,56 @@ async def validate_receipt(receipt_id: str, payload: ValidateReceiptInput):
         updated_ingredients = []
         ingredient_ids = []
         
-        for item in payload.items:
-            # Get receipt item
-            receipt_item = supabase.table("receipt_items") \
-                .select("*") \
-                .eq("id", item.receipt_item_id) \
-                .single() \
-                .execute()
-            
-            if not receipt_item.data:
-                logger.warning(f"Receipt item not found", extra={"request_id": request_id, "item_id": item.receipt_item_id})
-                continue
-            
-            # Update product_map (learning) - upsert to avoid duplicates
-            supabase.table("product_map").upsert({
-                "raw_name": receipt_item.data["raw_name"],
-                "ingredient_id": item.ingredient_id,
-                "confidence": 1.0
-            }, on_conflict="raw_name,ingredient_id").execute()
-            
-            # Get current price before update
-            ingredient = supabase.table("ingredients") \
-                .select("*") \
-                .eq("id", item.ingredient_id) \
-                .single() \
-                .execute()
-            
-            old_price = Decimal(str(ingredient.data["current_price"]))
-            new_price = item.price
-            
-            # Update ingredient price (category is preserved)
-            supabase.table("ingredients").update({
-                "current_price": float(new_price),
-                "last_updated": datetime.utcnow().isoformat()
-            }).eq("id", item.ingredient_id).execute()
-            
+        # Update product_map (learning), ingredient prices and receipt status in one RPC
+        rpc_items = [{
+            "receipt_item_id": item.receipt_item_id,
+            "ingredient_id": item.ingredient_id,
+            "price": str(item.price)
+        } for item in payload.items]
+        
+        validated = await execute_async(supabase.rpc("validate_receipt_items", {
+            "p_receipt_id": receipt_id,
+            "p_items": rpc_items
+        }))
+        
+        for row in validated.data:
             updated_ingredients.append({
-                "name": ingredient.data["name"],
-                "old_price": old_price,
-                "new_price": new_price
+                "name": row["ingredient_name"],
+                "old_price": Decimal(str(row["old_price"] or 0)),
+                "new_price": Decimal(str(row["new_price"]))
             })
-            ingredient_ids.append(item.ingredient_id)
-            
-            # Check if price change warrants alert
+            ingredient_ids.append(row["ingredient_id"])
+        
+        # The RPC returns one row per ingredient (repeated ingredients: last price wins)
+        requested_ingredients = len({item.ingredient_id for item in payload.items})
+        if len(updated_ingredients) < requested_ingredients:
+            logger.warning(f"Receipt items or ingredients not found", extra={"request_id": request_id, "skipped": requested_ingredients - len(updated_ingredients)})
+        
+        product_map_cache.clear()
+        ingredients_cache.clear()
+        ingredient_cost_cache.clear()
+        receipts_cache.clear()
+        
+        # Check if price changes warrant alerts
+        for updated in updated_ingredients:
+            old_price = updated["old_price"]
+            new_price = updated["new_price"]
             if old_price > 0:
                 change_pct = calculate_cmv_change_percentage(old_price, new_price)
                 if abs(change_pct) >= 10:
-                    send_price_alert(
-                        ingredient.data["name"],
-                        old_price,
-                        new_price,
-                        change_pct
-                    )
-                    logger.info("Price alert sent", extra={"request_id": request_id, "ingredient": ingredient.data["name"], "change_pct": change_pct})
+                    app.state.alert_queue.put_nowait({
+                        "ingredient_name": updated["name"],
+                        "old_price": old_price,
+                        "new_price": new_price,
+                        "change_percent": change_pct
+                    })
+                    logger.info("Price alert queued", extra={"request_id": request_id, "ingredient": updated["name"], "change_pct": change_pct})
         
         # Recalculate affected recipes
         affected_recipes = await recalculate_affected_recipes(ingredient_ids, supabase)
+        recipes_cache.clear()
         logger.info(f"Recipes recalculated", extra={"request_id": request_id, "count": len(affected_recipes)})
         
-        # Mark receipt as verified
-        supabase.table("receipts").update({
-            "status": "verified"
-        }).eq("id", receipt_id).execute()
-        
         logger.info("Receipt validation completed", extra={"request_id": request_id, "receipt_id": receipt_id})
         
         return {
@@ -332,39 +614,45 @@ async def validate_receipt(receipt_id: str, payload: ValidateReceiptInput):
 
 
 @app.get("/api/receipts/pending")
-def get_pending_receipts():
-    """Get all receipts waiting for validation."""
-    logger.debug("Fetching pending receipts")
+@cached(receipts_cache)
+def get_pending_receipts(offset: int = 0, limit: int = 50):
+    """Get receipts waiting for validation, newest first (paginated)."""
+    logger.debug("Fetching pending receipts", extra={"offset": offset, "limit": limit})
+    offset = max(offset, 0)
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
     response = supabase.table("receipts") \
-        .select("*, receipt_items(*)") \
+        .select(PENDING_RECEIPT_COLUMNS) \
         .eq("status", "pending_validation") \
         .order("created_at", desc=True) \
+        .range(offset, offset + limit - 1) \
         .execute()
     
     return response.data
 
 
 @app.get("/api/ingredients")
+@cached(ingredients_cache)
 def list_ingredients(search: Optional[str] = None):
     """List all ingredients with optional search."""
     logger.debug(f"Listing ingredients", extra={"search": search})
-    query = supabase.table("ingredients").select("*")
-    
     if search:
-        query = query.ilike("name", f"%{search}%")
+        # Trigram-indexed search, ordered by similarity
+        response = supabase.rpc("search_ingredients", {"q": search}).limit(SEARCH_LIMIT).execute()
+        return response.data
     
-    response = query.order("name").execute()
+    response = supabase.table("ingredients").select("*").order("name").execute()
     return response.data
 
 
 @app.get("/api/ingredients/pending")
+@cached(ingredients_cache)
 def list_pending_ingredients():
     """List ingredients with missing data (category or unit)."""
     logger.debug("Fetching pending ingredients")
-    response = supabase.table("ingredients") \
+    response = supabase.table("pending_ingredients") \
         .select("*") \
-        .or_("category.is.null,category.eq.,unit.is.null,unit.eq.") \
         .order("name") \
+        .limit(MAX_PENDING_INGREDIENTS) \
         .execute()
     return response.data
 
@@ -380,7 +668,6 @@ class CreateIngredientInput(BaseModel):
 class UpdateIngredientInput(BaseModel):
     name: Optional[str] = None
     category: Optional[str] = None
-    category: Optional[str] = None
     current_price: Optional[float] = None
     yield_coefficient: Optional[float] = None
     unit: Optional[str] = None
@@ -395,12 +682,12 @@ def create_ingredient(payload: CreateIngredientInput):
         data = {
             "name": payload.name.strip(),
             "category": payload.category,
-            "category": payload.category,
             "current_price": payload.current_price or 0,
             "yield_coefficient": payload.yield_coefficient or 1.0,
             "unit": payload.unit
         }
         response = supabase.table("ingredients").insert(data).execute()
+        ingredients_cache.clear()
         return response.data[0]
     except Exception as e:
         if "duplicate" in str(e).lower():
@@ -415,17 +702,10 @@ def update_ingredient(ingredient_id: str, payload: UpdateIngredientInput):
     logger.info(f"Updating ingredient: {ingredient_id}")
     
     try:
-        update_data = {}
-        if payload.name is not None:
-            update_data["name"] = payload.name.strip()
-        if payload.category is not None:
-            update_data["category"] = payload.category
-        if payload.current_price is not None:
-            update_data["current_price"] = payload.current_price
-        if payload.yield_coefficient is not None:
-            update_data["yield_coefficient"] = payload.yield_coefficient
-        if payload.unit is not None:
-            update_data["unit"] = payload.unit
+        # Only fields that were sent with a value are updated
+        update_data = payload.model_dump(exclude_none=True)
+        if "name" in update_data:
+            update_data["name"] = update_data["name"].strip()
         
         if not update_data:
             raise HTTPException(400, "No fields to update")
@@ -435,6 +715,11 @@ def update_ingredient(ingredient_id: str, payload: UpdateIngredientInput):
             .eq("id", ingredient_id) \
             .execute()
         
+        ingredients_cache.clear()
+        ingredient_cost_cache.pop(ingredient_id)
+        recipes_cache.clear()
+        product_map_cache.clear()  # cached matches embed ingredient name/category
+        
         if not response.data:
             raise HTTPException(404, "Ingredient not found")
         
@@ -447,13 +732,14 @@ def update_ingredient(ingredient_id: str, payload: UpdateIngredientInput):
 
 
 @app.get("/api/categories")
+@cached(categories_cache)
 def list_categories(search: Optional[str] = None):
     """List all ingredient categories with optional search."""
     logger.debug(f"Listing categories", extra={"search": search})
     query = supabase.table("ingredients_categories").select("*")
     
     if search:
-        query = query.ilike("name", f"%{search}%")
+        query = query.ilike("name", f"%{search}%").limit(SEARCH_LIMIT)
     
     response = query.order("name").execute()
     return response.data
@@ -466,7 +752,7 @@ def list_products(search: Optional[str] = None):
     query = supabase.table("products").select("id, product, sku, status")
     
     if search:
-        query = query.ilike("product", f"%{search}%")
+        query = query.ilike("product", f"%{search}%").limit(SEARCH_LIMIT)
         
     response = query.order("product").execute()
     return response.data
@@ -485,6 +771,7 @@ def create_category(payload: CreateCategoryInput):
         response = supabase.table("ingredients_categories").insert({
             "name": payload.name.strip().lower()
         }).execute()
+        categories_cache.clear()
         
         return response.data[0]
     except Exception as e:
@@ -498,6 +785,7 @@ def create_category(payload: CreateCategoryInput):
 # ============= Recipe Categories Endpoints =============
 
 @app.get("/api/recipe-categories", response_model=List[RecipeCategoryResponse])
+@cached(recipe_categories_cache)
 def get_recipe_categories():
     """List all recipe categories and their portions."""
     try:
@@ -536,6 +824,12 @@ class RecipeInput(BaseModel):
 
 # ============= Nutrition Constants =============
 
+# nutritional_ref columns materialized for pre-preparo recipes
+NUTRITION_FIELDS = [
+    "energy_kcal", "energy_kj", "protein_g", "carbs_g", "lipid_g", "saturated_fat_g",
+    "trans_fat_g", "fiber_g", "sodium_mg", "sugars_total_g", "sugars_added_g"
+]
+
 ANVISA_VD = {
     "energy_kcal": 2000,
     "carbs_g": 300,
@@ -548,46 +842,156 @@ ANVISA_VD = {
     "sodium_mg": 2000
 }
 
+# Nutrients on the ANVISA label, in label order (get_recipe_anvisa_totals columns)
+ANVISA_LABEL_NUTRIENTS = (
+    "energy_kcal", "carbs_g", "sugars_total_g", "sugars_added_g", "protein_g",
+    "lipid_g", "saturated_fat_g", "trans_fat_g", "fiber_g", "sodium_mg"
+)
+
+# Mapping between internal names and frontend names
+ANVISA_LABEL_KEYS = {
+    "energy_kcal": "energetic_value_kcal",
+    "energy_kj": "energetic_value_kj",
+    "carbs_g": "carbohydrates_g",
+    "sugars_total_g": "sugars_total_g",
+    "sugars_added_g": "sugars_added_g",
+    "protein_g": "proteins_g",
+    "lipid_g": "fats_total_g",
+    "saturated_fat_g": "fats_saturated_g",
+    "trans_fat_g": "fats_trans_g",
+    "fiber_g": "fibers_g",
+    "sodium_mg": "sodium_mg"
+}
+
+ANVISA_VD_KEYS = {
+    "energy_kcal": "energetic_value",
+    "carbs_g": "carbohydrates",
+    "sugars_added_g": "sugars_added",
+    "protein_g": "proteins",
+    "lipid_g": "fats_total",
+    "saturated_fat_g": "fats_saturated",
+    "fiber_g": "fibers",
+    "sodium_mg": "sodium"
+}
+
+# Thresholds for FOP (Lupa) per 100g: nutrient -> (high_in flag, limit)
+ANVISA_FOP_THRESHOLDS = {
+    "sugars_added_g": ("sugars_added", 15),
+    "saturated_fat_g": ("saturated_fat", 6),
+    "sodium_mg": ("sodium", 600)
+}
+
 
 # ============= Recipe Logic =============
 
-def calculate_recipe_totals(yield_units: float, ingredients: List[dict], labor_cost: Decimal) -> dict:
-    """Calculate total cost and CMV metrics including breakdawn."""
-    total_batch_ingredients_cost = Decimal("0.00")
-    total_batch_packaging_cost = Decimal("0.00")
-    total_weight = Decimal("0.00")
-    
+def merge_recipe_ingredients(ingredients: List[RecipeIngredientInput]) -> dict:
+    """Map ingredient_id -> total quantity (one row per ingredient in recipe_ingredients)."""
+    merged = {}
     for item in ingredients:
-        qty = Decimal(str(item["quantity"]))
-        price = Decimal(str(item.get("current_price", 0)))
-        yield_coeff = Decimal(str(item.get("yield_coefficient", 1)))
-        category = item.get("category", "")
-        
-        if yield_coeff > 0:
-            effective_price = price / yield_coeff
+        merged[item.ingredient_id] = merged.get(item.ingredient_id, 0) + item.quantity
+    return merged
+
+
+def calculate_payload_totals(payload: RecipeInput):
+    """Price the payload's ingredients and return (calc_ingredients, totals)."""
+    price_map = fetch_ingredient_cost_data([i.ingredient_id for i in payload.ingredients])
+    
+    calc_ingredients = []
+    for item in payload.ingredients:
+        ing_data = price_map.get(item.ingredient_id, {"price": 0, "yield": 1, "category": "", "nutritional_ref_id": None})
+        calc_ingredients.append({
+            "quantity": item.quantity,
+            "current_price": ing_data["price"],
+            "yield_coefficient": ing_data["yield"],
+            "category": ing_data["category"],
+            "nutritional_ref_id": ing_data.get("nutritional_ref_id")
+        })
+    
+    totals = calculate_recipe_totals(
+        payload.yield_units, 
+        calc_ingredients, 
+        Decimal(str(payload.labor_cost))
+    )
+    return calc_ingredients, totals
+
+
+def fetch_ingredient_cost_data(ing_ids: List[str]) -> dict:
+    """Return price/yield/category/nutrition ref per ingredient id, only querying ids not cached."""
+    price_map = {}
+    missing = []
+    for ing_id in set(ing_ids):
+        entry = ingredient_cost_cache.get(ing_id)
+        if entry is None:
+            missing.append(ing_id)
         else:
-            effective_price = price
+            price_map[ing_id] = entry
+    
+    if missing:
+        ing_response = supabase.table("ingredients").select("id, current_price, yield_coefficient, category, nutritional_ref_id").in_("id", missing).execute()
+        for i in ing_response.data:
+            entry = {
+                "price": float(i.get("current_price") or 0), 
+                "yield": float(i.get("yield_coefficient", 1) or 1), 
+                "category": i.get("category", ""),
+                "nutritional_ref_id": i.get("nutritional_ref_id")
+            }
+            ingredient_cost_cache.set(i["id"], entry)
+            price_map[i["id"]] = entry
+    
+    return price_map
 
-        item_cost = effective_price * qty
-        
-        if category and 'EMBALAGEM' in category.upper():
-            total_batch_packaging_cost += item_cost
+
+def fetch_nutritional_refs(ref_ids: List[str]) -> dict:
+    """Return nutritional_ref rows per id, only querying ids not cached."""
+    refs_map = {}
+    missing = []
+    for ref_id in set(ref_ids):
+        entry = nutritional_ref_cache.get(ref_id)
+        if entry is None:
+            missing.append(ref_id)
         else:
-            total_batch_ingredients_cost += item_cost
-            total_weight += qty
+            refs_map[ref_id] = entry
+    
+    if missing:
+        refs_response = supabase.table("nutritional_ref").select("*").in_("id", missing).execute()
+        for r in refs_response.data:
+            nutritional_ref_cache.set(r["id"], r)
+            refs_map[r["id"]] = r
+    
+    return refs_map
+
+
+def calculate_recipe_totals(yield_units: float, ingredients: List[dict], labor_cost: Decimal) -> dict:
+    """Calculate total cost and CMV metrics including breakdawn."""
+    n = len(ingredients)
+    qty = np.fromiter((float(i["quantity"]) for i in ingredients), dtype=np.float64, count=n)
+    price = np.fromiter((float(i.get("current_price") or 0) for i in ingredients), dtype=np.float64, count=n)
+    yield_coeff = np.fromiter((float(i.get("yield_coefficient", 1)) for i in ingredients), dtype=np.float64, count=n)
+    is_packaging = np.fromiter(
+        (is_packaging_category(i.get("category")) for i in ingredients),
+        dtype=bool, count=n
+    )
+    
+    # Non-positive yield coefficients are ignored (price used as-is)
+    effective_price = np.divide(price, yield_coeff, out=price.copy(), where=yield_coeff > 0)
+    item_cost = effective_price * qty
+    
+    total_batch_packaging_cost = float(item_cost[is_packaging].sum())
+    total_batch_ingredients_cost = float(item_cost[~is_packaging].sum())
+    total_weight = float(qty[~is_packaging].sum())
             
-    total_cost = total_batch_ingredients_cost + total_batch_packaging_cost + labor_cost
+    total_cost = total_batch_ingredients_cost + total_batch_packaging_cost + float(labor_cost)
         
-    cmv_per_unit = total_cost / Decimal(yield_units) if yield_units > 0 else Decimal("0.00")
-    cmv_per_kg = total_cost / total_weight if total_weight > 0 else Decimal("0.00")
+    cmv_per_unit = total_cost / yield_units if yield_units > 0 else 0.0
+    cmv_per_kg = total_cost / total_weight if total_weight > 0 else 0.0
     
     return {
-        "current_cost": float(total_cost),
-        "ingredients_cost": float(total_batch_ingredients_cost),
-        "packaging_cost": float(total_batch_packaging_cost),
-        "total_weight_kg": float(total_weight), # Input weight
-        "cmv_per_unit": float(cmv_per_unit),
-        "cmv_per_kg": float(cmv_per_kg)
+        "current_cost": total_cost,
+        "ingredients_cost": total_batch_ingredients_cost,
+        "packaging_cost": total_batch_packaging_cost,
+        "total_weight_kg": total_weight, # Input weight
+        "cmv_per_unit": cmv_per_unit,
+        "cmv_per_kg": cmv_per_kg
     }
 
 def materialize_pre_preparo_nutrition(recipe_name: str, calc_ingredients: List[dict], finished_weight_kg: float, existing_ref_id: Optional[str] = None) -> Optional[str]:
@@ -595,84 +999,45 @@ def materialize_pre_preparo_nutrition(recipe_name: str, calc_ingredients: List[d
     if finished_weight_kg <= 0:
         return existing_ref_id
         
-    total_energy_kcal = Decimal("0")
-    total_energy_kj = Decimal("0")
-    total_protein = Decimal("0")
-    total_carbs = Decimal("0")
-    total_lipid = Decimal("0")
-    total_sat_fat = Decimal("0")
-    total_trans_fat = Decimal("0")
-    total_fiber = Decimal("0")
-    total_sodium = Decimal("0")
-    total_sugars_total = Decimal("0")
-    total_sugars_added = Decimal("0")
-    
     # We need to fetch the actual nutritional data for the refs.
     ref_ids = [item.get("nutritional_ref_id") for item in calc_ingredients if item.get("nutritional_ref_id")]
     if not ref_ids:
         return existing_ref_id # Cannot calculate if no ingredients have nutrition
         
-    refs_response = supabase.table("nutritional_ref").select("*").in_("id", ref_ids).execute()
-    refs_map = {r["id"]: r for r in refs_response.data}
-    
-    has_any_data = False
+    refs_map = fetch_nutritional_refs(ref_ids)
     
+    # One row per ingredient with nutrition data: quantity relative to the ref's base
+    # quantity, and the ref's nutrient values in NUTRITION_FIELDS order
+    multipliers = []
+    ref_values = []
     for item in calc_ingredients:
-        qty_kg = Decimal(str(item["quantity"]))
-        qty_g = qty_kg * 1000
-        ref_id = item.get("nutritional_ref_id")
-        
-        if not ref_id or ref_id not in refs_map:
+        ref_data = refs_map.get(item.get("nutritional_ref_id"))
+        if not ref_data:
             continue
-            
-        ref_data = refs_map[ref_id]
-        base_qty = Decimal(str(ref_data.get("base_qty_g") or 100))
+        base_qty = float(ref_data.get("base_qty_g") or 100)
         if base_qty <= 0: continue
         
-        multiplier = qty_g / base_qty
-        
-        total_energy_kcal += Decimal(str(ref_data.get("energy_kcal") or 0)) * multiplier
-        total_energy_kj += Decimal(str(ref_data.get("energy_kj") or 0)) * multiplier
-        total_protein += Decimal(str(ref_data.get("protein_g") or 0)) * multiplier
-        total_carbs += Decimal(str(ref_data.get("carbs_g") or 0)) * multiplier
-        total_lipid += Decimal(str(ref_data.get("lipid_g") or 0)) * multiplier
-        total_sat_fat += Decimal(str(ref_data.get("saturated_fat_g") or 0)) * multiplier
-        total_trans_fat += Decimal(str(ref_data.get("trans_fat_g") or 0)) * multiplier
-        total_fiber += Decimal(str(ref_data.get("fiber_g") or 0)) * multiplier
-        total_sodium += Decimal(str(ref_data.get("sodium_mg") or 0)) * multiplier
-        total_sugars_total += Decimal(str(ref_data.get("sugars_total_g") or 0)) * multiplier
-        total_sugars_added += Decimal(str(ref_data.get("sugars_added_g") or 0)) * multiplier
-        has_any_data = True
+        multipliers.append(float(item["quantity"]) * 1000 / base_qty)
+        ref_values.append([float(ref_data.get(field) or 0) for field in NUTRITION_FIELDS])
         
-    if not has_any_data:
+    if not multipliers:
         return existing_ref_id
         
-    # Now divide by total_weight_g to get to 100g chunk
-    total_weight_g = Decimal(str(finished_weight_kg)) * 1000
-    if total_weight_g <= 0: return existing_ref_id
-    
-    ratio_100g = Decimal("100") / total_weight_g
+    # Batch totals, then scaled down to a 100g chunk of the finished weight
+    ratio_100g = 100.0 / (finished_weight_kg * 1000)
+    totals_100g = np.asarray(multipliers) @ np.asarray(ref_values) * ratio_100g
     
     new_nutri_data = {
         "description": f"Pré-preparo: {recipe_name}",
         "category": "Pre-preparo",
         "tbca_code": f"PRE-{uuid.uuid4().hex[:8]}".upper(),
         "base_qty_g": 100.0,
-        "energy_kcal": float(round(total_energy_kcal * ratio_100g, 2)),
-        "energy_kj": float(round(total_energy_kj * ratio_100g, 2)),
-        "protein_g": float(round(total_protein * ratio_100g, 2)),
-        "carbs_g": float(round(total_carbs * ratio_100g, 2)),
-        "lipid_g": float(round(total_lipid * ratio_100g, 2)),
-        "saturated_fat_g": float(round(total_sat_fat * ratio_100g, 2)),
-        "trans_fat_g": float(round(total_trans_fat * ratio_100g, 2)),
-        "fiber_g": float(round(total_fiber * ratio_100g, 2)),
-        "sodium_mg": float(round(total_sodium * ratio_100g, 2)),
-        "sugars_total_g": float(round(total_sugars_total * ratio_100g, 2)),
-        "sugars_added_g": float(round(total_sugars_added * ratio_100g, 2))
+        **dict(zip(NUTRITION_FIELDS, np.round(totals_100g, 2).tolist()))
     }
     
     if existing_ref_id:
         supabase.table("nutritional_ref").update(new_nutri_data).eq("id", existing_ref_id).execute()
+        nutritional_ref_cache.pop(existing_ref_id)
         return existing_ref_id
     else:
         res = supabase.table("nutritional_ref").insert(new_nutri_data).execute()
@@ -688,46 +1053,19 @@ def create_recipe(payload: RecipeInput):
     logger.info(f"Creating recipe: {payload.name}")
     
     try:
-        # 1. Fetch current prices for ingredients
-        ing_ids = [i.ingredient_id for i in payload.ingredients]
-        if ing_ids:
-            ing_response = supabase.table("ingredients").select("id, current_price, yield_coefficient, category, nutritional_ref_id").in_("id", ing_ids).execute()
-            price_map = {i["id"]: {
-                "price": float(i.get("current_price") or 0), 
-                "yield": float(i.get("yield_coefficient", 1) or 1), 
-                "category": i.get("category", ""),
-                "nutritional_ref_id": i.get("nutritional_ref_id")
-            } for i in ing_response.data}
-        else:
-            price_map = {}
-            
-        # 2. Prepare ingredients list with prices for calculation
-        calc_ingredients = []
-        for item in payload.ingredients:
-            ing_data = price_map.get(item.ingredient_id, {"price": 0, "yield": 1, "category": "", "nutritional_ref_id": None})
-            calc_ingredients.append({
-                "quantity": item.quantity,
-                "current_price": ing_data["price"],
-                "yield_coefficient": ing_data["yield"],
-                "category": ing_data["category"],
-                "nutritional_ref_id": ing_data.get("nutritional_ref_id")
-            })
-            
-        # 3. Calculate totals
-        totals = calculate_recipe_totals(
-            payload.yield_units, 
-            calc_ingredients, 
-            Decimal(str(payload.labor_cost))
-        )
+        # Cost aggregates (ingredients/packaging/current cost, weight) are computed by the
+        # recipe_ingredients trigger; only pre-preparo needs totals here, for its derived ingredient.
         
-        # 4. Handle pre-preparo derived ingredient and its nutrition
+        # 1. Handle pre-preparo derived ingredient and its nutrition
         derived_ing_id = None
-        if getattr(payload, 'is_pre_preparo', False):
+        if payload.is_pre_preparo:
+            calc_ingredients, totals = calculate_payload_totals(payload)
+            
             # Calculate and materialize nutrition before creating the ingredient
             # Calculate finished weight for nutrition accuracy
             yield_units = Decimal(str(payload.yield_units or 0))
             net_weight = Decimal(str(payload.net_weight or 0)) if payload.net_weight else Decimal("0")
-            prod_unit = getattr(payload, 'production_unit', 'KG').upper()
+            prod_unit = (payload.production_unit or "KG").upper()
             if prod_unit == "KG" and yield_units > 0:
                 finished_weight_kg = float(yield_units)
             elif yield_units > 0 and net_weight > 0:
@@ -746,47 +1084,48 @@ def create_recipe(payload: RecipeInput):
                 "category": "Pré-preparo",
                 "current_price": float(totals["cmv_per_unit"]),
                 "yield_coefficient": 1.0,
-                "unit": getattr(payload, 'production_unit', 'KG'),
+                "unit": payload.production_unit,
                 "nutritional_ref_id": new_ref_id
             }
             res_ing = supabase.table("ingredients").insert(ing_data).execute()
             if res_ing.data:
                 derived_ing_id = res_ing.data[0]["id"]
                 
-        # 5. Insert Recipe
+        # 2. Recipe row
         recipe_data = {
             "name": payload.name,
             "yield_units": payload.yield_units,
             "labor_minutes": payload.labor_minutes,
             "labor_cost": payload.labor_cost,
-            "ingredients_cost": totals["ingredients_cost"],
-            "packaging_cost": totals["packaging_cost"],
             "sku": payload.sku,
             "product_id": payload.product_id,
-            "current_cost": totals["current_cost"],
-            "total_weight_kg": totals["total_weight_kg"],
-            "is_pre_preparo": getattr(payload, 'is_pre_preparo', False),
+            "total_weight_kg": 0,  # Filled in by the recipe_ingredients trigger
+            "is_pre_preparo": payload.is_pre_preparo,
             "category_id": payload.category_id,
             "derived_ingredient_id": derived_ing_id,
-            "production_unit": getattr(payload, 'production_unit', 'KG'),
+            "production_unit": payload.production_unit,
             "net_weight": payload.net_weight,
             "sauce_yield_kg": payload.sauce_yield_kg,
-            "status": getattr(payload, 'status', 'ativo') or 'ativo',
+            "status": payload.status or 'ativo'
             # cmv_per_unit & cmv_per_kg are generated by DB
-            "last_calculated": datetime.utcnow().isoformat()
         }
-        res = supabase.table("recipes").insert(recipe_data).execute()
+        
+        # 3. Insert recipe and its ingredients in one RPC; the returned row already
+        #    carries the totals computed by the recipe_ingredients trigger
+        recipe_ingredients = [{
+            "ingredient_id": ing_id,
+            "quantity": qty
+        } for ing_id, qty in merge_recipe_ingredients(payload.ingredients).items()]
+        
+        res = supabase.rpc("create_recipe_with_ingredients", {
+            "p_recipe": recipe_data,
+            "p_ingredients": recipe_ingredients
+        }).execute()
         recipe = res.data[0]
         
-        # 5. Insert Recipe Ingredients
-        if payload.ingredients:
-            recipe_ingredients = [{
-                "recipe_id": recipe["id"],
-                "ingredient_id": i.ingredient_id,
-                "quantity": i.quantity
-            } for i in payload.ingredients]
-            
-            supabase.table("recipe_ingredients").insert(recipe_ingredients).execute()
+        recipes_cache.clear()
+        if derived_ing_id:
+            ingredients_cache.clear()
             
         return recipe
         
@@ -796,19 +1135,21 @@ def create_recipe(payload: RecipeInput):
 
 
 @app.get("/api/recipes/{recipe_id}")
-def get_recipe(recipe_id: str):
+@cached(recipes_cache)
+async def get_recipe(recipe_id: str):
     """Get recipe details including ingredients."""
     try:
-        # Fetch recipe
-        recipe_res = supabase.table("recipes").select("*").eq("id", recipe_id).single().execute()
+        # Recipe and its ingredients are fetched concurrently
+        recipe_res, ing_res = await asyncio.gather(
+            execute_async(supabase.table("recipes").select("*").eq("id", recipe_id).single()),
+            execute_async(
+                supabase.table("recipe_ingredients")
+                .select("*, ingredients(name, unit, current_price, category, yield_coefficient, nutritional_ref_id)")
+                .eq("recipe_id", recipe_id)
+            )
+        )
         if not recipe_res.data:
             raise HTTPException(404, "Recipe not found")
-        
-        # Fetch ingredients with details
-        ing_res = supabase.table("recipe_ingredients") \
-            .select("*, ingredients(name, unit, current_price, category, yield_coefficient, nutritional_ref_id)") \
-            .eq("recipe_id", recipe_id) \
-            .execute()
             
         recipe = recipe_res.data
         recipe["ingredients"] = ing_res.data
@@ -828,55 +1169,28 @@ def update_recipe(recipe_id: str, payload: RecipeInput):
     logger.info(f"Received payload category_id: {payload.category_id}, product_id: {payload.product_id}")
     
     try:
-        # 1. Fetch current prices
-        ing_ids = [i.ingredient_id for i in payload.ingredients]
-        if ing_ids:
-            ing_response = supabase.table("ingredients").select("id, current_price, yield_coefficient, category, nutritional_ref_id").in_("id", ing_ids).execute()
-            price_map = {i["id"]: {
-                "price": float(i.get("current_price") or 0), 
-                "yield": float(i.get("yield_coefficient", 1) or 1), 
-                "category": i.get("category", ""),
-                "nutritional_ref_id": i.get("nutritional_ref_id")
-            } for i in ing_response.data}
-        else:
-            price_map = {}
-            
-        # 2. Calculate totals
-        calc_ingredients = []
-        for item in payload.ingredients:
-            ing_data = price_map.get(item.ingredient_id, {"price": 0, "yield": 1, "category": "", "nutritional_ref_id": None})
-            calc_ingredients.append({
-                "quantity": item.quantity,
-                "current_price": ing_data["price"],
-                "yield_coefficient": ing_data["yield"],
-                "category": ing_data["category"],
-                "nutritional_ref_id": ing_data.get("nutritional_ref_id")
-            })
+        # 1. Handle pre-preparo derived ingredient and its nutrition
+        #    (other cost aggregates are computed by the recipe_ingredients trigger)
+        derived_ing_id = None
+        if payload.is_pre_preparo:
+            # Fetch existing recipe's derived_ingredient_id and that ingredient's
+            # nutritional_ref_id (embedded through the FK) in one query
+            existing_recipe_res = supabase.table("recipes") \
+                .select("derived_ingredient_id, ingredients!derived_ingredient_id(nutritional_ref_id)") \
+                .eq("id", recipe_id) \
+                .single() \
+                .execute()
+            existing_recipe = existing_recipe_res.data if existing_recipe_res else {}
+            derived_ing_id = existing_recipe.get("derived_ingredient_id")
+            derived_ing = existing_recipe.get("ingredients") or {}
+            existing_ref_id = derived_ing.get("nutritional_ref_id")
             
-        totals = calculate_recipe_totals(
-            payload.yield_units, 
-            calc_ingredients, 
-            Decimal(str(payload.labor_cost))
-        )
-        
-        # Fetch existing recipe to get derived_ingredient_id
-        existing_recipe_res = supabase.table("recipes").select("derived_ingredient_id").eq("id", recipe_id).single().execute()
-        existing_recipe = existing_recipe_res.data if existing_recipe_res else {}
-        derived_ing_id = existing_recipe.get("derived_ingredient_id")
-        
-        # 3. Handle pre-preparo derived ingredient and its nutrition
-        if getattr(payload, 'is_pre_preparo', False):
-            existing_ref_id = None
-            if derived_ing_id:
-                # Need to fetch the current derived ingredient to get its nutritional_ref_id if any
-                target_ing_res = supabase.table("ingredients").select("nutritional_ref_id").eq("id", derived_ing_id).execute()
-                if target_ing_res.data:
-                    existing_ref_id = target_ing_res.data[0].get("nutritional_ref_id")
+            calc_ingredients, totals = calculate_payload_totals(payload)
                     
             # Calculate finished weight for nutrition accuracy
             yield_units = Decimal(str(payload.yield_units or 0))
             net_weight = Decimal(str(payload.net_weight or 0)) if payload.net_weight else Decimal("0")
-            prod_unit = getattr(payload, 'production_unit', 'KG').upper()
+            prod_unit = (payload.production_unit or "KG").upper()
             if prod_unit == "KG" and yield_units > 0:
                 finished_weight_kg = float(yield_units)
             elif yield_units > 0 and net_weight > 0:
@@ -896,51 +1210,50 @@ def update_recipe(recipe_id: str, payload: RecipeInput):
                 "category": "Pré-preparo",
                 "current_price": float(totals["cmv_per_unit"]),
                 "yield_coefficient": 1.0,
-                "unit": getattr(payload, 'production_unit', 'KG'),
+                "unit": payload.production_unit,
                 "nutritional_ref_id": updated_ref_id
             }
             if derived_ing_id:
                 supabase.table("ingredients").update(ing_data).eq("id", derived_ing_id).execute()
+                ingredient_cost_cache.pop(derived_ing_id)
             else:
                 res_ing = supabase.table("ingredients").insert(ing_data).execute()
                 if res_ing.data:
                     derived_ing_id = res_ing.data[0]["id"]
         
-        # 4. Update Recipe
+        # 2. Update Recipe
         recipe_data = {
             "name": payload.name,
             "yield_units": payload.yield_units,
             "labor_minutes": payload.labor_minutes,
             "labor_cost": payload.labor_cost,
-            "ingredients_cost": totals["ingredients_cost"],
-            "packaging_cost": totals["packaging_cost"],
             "sku": payload.sku,
             "product_id": payload.product_id,
-            "current_cost": totals["current_cost"],
-            "total_weight_kg": totals["total_weight_kg"],
-            "is_pre_preparo": getattr(payload, 'is_pre_preparo', False),
+            "is_pre_preparo": payload.is_pre_preparo,
             "category_id": payload.category_id,
-            "derived_ingredient_id": derived_ing_id,
-            "production_unit": getattr(payload, 'production_unit', 'KG'),
+            "derived_ingredient_id": derived_ing_id,  # None keeps the current one
+            "production_unit": payload.production_unit,
             "net_weight": payload.net_weight,
-            "status": getattr(payload, 'status', 'ativo') or 'ativo',
+            "status": payload.status or 'ativo'
             # cmv_per_unit & cmv_per_kg are generated by DB
-            "last_calculated": datetime.utcnow().isoformat()
         }
-        supabase.table("recipes").update(recipe_data).eq("id", recipe_id).execute()
         
-        # 4. Update Ingredients (Delete all and re-insert)
-        # Transaction would be better but Supabase-py doesn't support it easily yet
-        supabase.table("recipe_ingredients").delete().eq("recipe_id", recipe_id).execute()
+        # 3. Update recipe and sync its ingredients in one RPC (one transaction):
+        #    unchanged rows are kept, changed ones upserted, removed ones deleted
+        recipe_ingredients = [{
+            "ingredient_id": ing_id,
+            "quantity": qty
+        } for ing_id, qty in merge_recipe_ingredients(payload.ingredients).items()]
         
-        if payload.ingredients:
-            recipe_ingredients = [{
-                "recipe_id": recipe_id,
-                "ingredient_id": i.ingredient_id,
-                "quantity": i.quantity
-            } for i in payload.ingredients]
-            
-            supabase.table("recipe_ingredients").insert(recipe_ingredients).execute()
+        supabase.rpc("update_recipe_with_ingredients", {
+            "p_recipe_id": recipe_id,
+            "p_recipe": recipe_data,
+            "p_ingredients": recipe_ingredients
+        }).execute()
+        
+        recipes_cache.clear()
+        if derived_ing_id:
+            ingredients_cache.clear()
             
         return {"id": recipe_id, "status": "updated"}
         
@@ -953,9 +1266,9 @@ def update_recipe(recipe_id: str, payload: RecipeInput):
 def delete_recipe(recipe_id: str):
     """Delete a recipe and its ingredients."""
     try:
-        # Cascade delete handled by foreign key usually, but let's be safe
-        supabase.table("recipe_ingredients").delete().eq("recipe_id", recipe_id).execute()
+        # recipe_ingredients rows are removed by ON DELETE CASCADE
         supabase.table("recipes").delete().eq("id", recipe_id).execute()
+        recipes_cache.clear()
         return {"status": "success"}
     except Exception as e:
         logger.error(f"Failed to delete recipe: {e}")
@@ -963,14 +1276,24 @@ def delete_recipe(recipe_id: str):
 
 
 @app.get("/api/recipes/{recipe_id}/anvisa-label")
-def get_recipe_anvisa_label(recipe_id: str):
+@cached(recipes_cache)
+async def get_recipe_anvisa_label(recipe_id: str):
     """
     Calculate and return the ANVISA nutritional label for a recipe.
     Calculates values per portion based on the recipe's category.
     """
     try:
-        # 1. Fetch recipe and its category
-        recipe_res = supabase.table("recipes").select("*, recipe_categories(name, anvisa_portion_g)").eq("id", recipe_id).single().execute()
+        # 1. Fetch recipe (with its category) and the batch nutrient totals,
+        # aggregated by get_recipe_anvisa_totals, concurrently
+        recipe_res, totals_res = await asyncio.gather(
+            execute_async(
+                supabase.table("recipes")
+                .select("name, yield_units, net_weight, production_unit, total_weight_kg, recipe_categories(name, anvisa_portion_g)")
+                .eq("id", recipe_id)
+                .single()
+            ),
+            execute_async(supabase.rpc("get_recipe_anvisa_totals", {"p_recipe_id": recipe_id}))
+        )
         if not recipe_res.data:
             raise HTTPException(404, "Recipe not found")
         
@@ -978,45 +1301,25 @@ def get_recipe_anvisa_label(recipe_id: str):
         category = recipe.get("recipe_categories")
         portion_g = float(category.get("anvisa_portion_g", 100)) if category else 100
         
-        # 2. Fetch recipe ingredients and their nutritional data
-        ing_res = supabase.table("recipe_ingredients") \
-            .select("quantity, ingredients(id, nutritional_ref_id)") \
-            .eq("recipe_id", recipe_id) \
-            .execute()
-            
-        if not ing_res.data:
+        # 2. Check the recipe has ingredients with nutritional data
+        totals = totals_res.data[0]
+        if not totals["ingredient_count"]:
             raise HTTPException(400, "Recipe has no ingredients")
 
-        # 3. Aggregate nutritional data
-        nutri_ids = [i["ingredients"]["nutritional_ref_id"] for i in ing_res.data if i["ingredients"]["nutritional_ref_id"]]
-        if not nutri_ids:
+        if not totals["linked_count"]:
              return {
                 "recipe_name": recipe["name"],
                 "portion_g": portion_g,
                 "error": "Nenhum ingrediente possui tabela nutricional vinculada."
             }
 
-        nutri_res = supabase.table("nutritional_ref").select("*").in_("id", nutri_ids).execute()
-        nutri_map = {n["id"]: n for n in nutri_res.data}
-
-        # Totals for the entire batch
-        batch_totals = {
-            "energy_kcal": Decimal("0.0"),
-            "carbs_g": Decimal("0.0"),
-            "sugars_total_g": Decimal("0.0"),
-            "sugars_added_g": Decimal("0.0"),
-            "protein_g": Decimal("0.0"),
-            "lipid_g": Decimal("0.0"),
-            "saturated_fat_g": Decimal("0.0"),
-            "trans_fat_g": Decimal("0.0"),
-            "fiber_g": Decimal("0.0"),
-            "sodium_mg": Decimal("0.0")
-        }
+        # 3. Totals for the entire batch
+        batch_totals = {key: Decimal(str(totals[key])) for key in ANVISA_LABEL_NUTRIENTS}
 
         # Calculate finished weight based on yield
         yield_units = Decimal(str(recipe.get("yield_units") or 0))
         net_weight = Decimal(str(recipe.get("net_weight") or 0)) if recipe.get("net_weight") else Decimal("0")
-        production_unit = recipe.get("production_unit", "KG").upper()
+        production_unit = (recipe.get("production_unit") or "KG").upper()
 
         if production_unit == "KG" and yield_units > 0:
             finished_weight_g = yield_units * 1000
@@ -1026,18 +1329,6 @@ def get_recipe_anvisa_label(recipe_id: str):
             # Fallback to input weight if yield info is missing
             finished_weight_g = Decimal(str(recipe.get("total_weight_kg", 0))) * 1000
 
-        for item in ing_res.data:
-            qty_g = Decimal(str(item["quantity"])) * 1000
-            ref_id = item["ingredients"]["nutritional_ref_id"]
-            if ref_id and ref_id in nutri_map:
-                ref = nutri_map[ref_id]
-                # Each ref value is per 100g
-                factor = qty_g / Decimal("100.0")
-                for key in batch_totals.keys():
-                    val = ref.get(key)
-                    if val is not None:
-                        batch_totals[key] += Decimal(str(val)) * factor
-
         # 4. Calculate values per portion
         if finished_weight_g <= 0:
             raise HTTPException(400, "Recipe finished weight is zero")
@@ -1059,65 +1350,31 @@ def get_recipe_anvisa_label(recipe_id: str):
             }
         }
 
-        # Mapping between internal names and frontend names
-        key_map = {
-            "energy_kcal": "energetic_value_kcal",
-            "energy_kj": "energetic_value_kj",
-            "carbs_g": "carbohydrates_g",
-            "sugars_total_g": "sugars_total_g",
-            "sugars_added_g": "sugars_added_g",
-            "protein_g": "proteins_g",
-            "lipid_g": "fats_total_g",
-            "saturated_fat_g": "fats_saturated_g",
-            "trans_fat_g": "fats_trans_g",
-            "fiber_g": "fibers_g",
-            "sodium_mg": "sodium_mg"
-        }
-
-        vd_map = {
-            "energy_kcal": "energetic_value",
-            "carbs_g": "carbohydrates",
-            "sugars_added_g": "sugars_added",
-            "protein_g": "proteins",
-            "lipid_g": "fats_total",
-            "saturated_fat_g": "fats_saturated",
-            "fiber_g": "fibers",
-            "sodium_mg": "sodium"
-        }
-
-        # Thresholds for FOP (Lupa) per 100g
-        fop_thresholds = {
-            "sugars_added_g": 15,
-            "saturated_fat_g": 6,
-            "sodium_mg": 600
-        }
-
         for key, total_batch_val in batch_totals.items():
             # Value for the specific portion
             val_per_portion = float(total_batch_val * portion_factor)
             # Value per 100g for FOP (Lupa) check and second column
             val_100g = float(total_batch_val * factor_100g)
             
-            fe_key = key_map.get(key, key)
+            fe_key = ANVISA_LABEL_KEYS.get(key, key)
             label_data["nutrients"][fe_key] = round(val_per_portion, 1)
             label_data["nutrients_100g"][fe_key] = round(val_100g, 1)
             
             # Check Lupa limits
-            if key == "sugars_added_g" and val_100g >= fop_thresholds["sugars_added_g"]:
-                label_data["high_in"]["sugars_added"] = True
-            elif key == "saturated_fat_g" and val_100g >= fop_thresholds["saturated_fat_g"]:
-                label_data["high_in"]["saturated_fat"] = True
-            elif key == "sodium_mg" and val_100g >= fop_thresholds["sodium_mg"]:
-                label_data["high_in"]["sodium"] = True
+            fop = ANVISA_FOP_THRESHOLDS.get(key)
+            if fop and val_100g >= fop[1]:
+                label_data["high_in"][fop[0]] = True
 
             # %VD
-            if key in ANVISA_VD and ANVISA_VD[key] is not None:
-                vd_val = ANVISA_VD[key]
-                vd_fe_key = vd_map.get(key, key)
+            vd_val = ANVISA_VD.get(key)
+            if vd_val is not None:
+                vd_fe_key = ANVISA_VD_KEYS.get(key, key)
                 label_data["daily_values"][vd_fe_key] = round((val_per_portion / vd_val) * 100)
 
         return label_data
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to generate ANVISA label for recipe {recipe_id}: {e}")
         raise HTTPException(500, f"Error generating label: {str(e)}")
@@ -1164,14 +1421,22 @@ def get_nutrition_report():
 
 
 @app.get("/api/recipes")
-def list_recipes(status: Optional[str] = "ativo"):
-    """List recipes filtered by status. Defaults to 'ativo'."""
-    logger.debug(f"Fetching recipes with status={status}")
-    response = supabase.table("recipes") \
-        .select("*") \
+@cached(recipes_cache)
+def list_recipes(status: Optional[str] = "ativo", offset: int = 0, limit: Optional[int] = None):
+    """
+    List recipes filtered by status. Defaults to 'ativo'.
+    Paginated when limit is given; without it the full list is returned.
+    """
+    logger.debug(f"Fetching recipes with status={status}", extra={"offset": offset, "limit": limit})
+    query = supabase.table("recipes") \
+        .select(RECIPE_LIST_COLUMNS) \
         .eq("status", status) \
-        .order("name") \
-        .execute()
+        .order("name")
+    if limit is not None:
+        offset = max(offset, 0)
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+        query = query.range(offset, offset + limit - 1)
+    response = query.execute()
     
     return response.data
 
@@ -1204,7 +1469,6 @@ def update_production_process(process_id: str, process: ProductionProcessInput):
     """Update a standard production process."""
     try:
         update_data = process.model_dump(exclude_unset=True)
-        update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
         response = supabase.table("production_processes").update(update_data).eq("id", process_id).execute()
         if not response.data:
             raise HTTPException(404, "Processo não encontrado")
@@ -1268,7 +1532,6 @@ def update_production_schedule(schedule_id: str, entry: ProductionScheduleInput)
     """Update a production schedule entry (status, duration, etc)."""
     try:
         update_data = entry.model_dump(exclude_unset=True)
-        update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
         
         if isinstance(update_data.get("planned_date"), datetime):
             update_data["planned_date"] = update_data["planned_date"].date().isoformat()
@@ -1314,10 +1577,7 @@ def save_settings(payload: dict):
         # Check if exists
         response = supabase.table("integration_settings").select("id").eq("service_name", "app_config").execute()
         
-        update_data = {
-            "settings": payload,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }
+        update_data = {"settings": payload}
         
         if response.data:
             res = supabase.table("integration_settings").update(update_data).eq("service_name", "app_config").execute()
@@ -1401,7 +1661,7 @@ def get_dre(year: int, month: int):
             )
             
             # 2. Pre-fetch historical CMV for ALL products in these orders
-            all_pids = list(set([it["product_id"] for it in items_res.data if it.get("product_id")]))
+            all_pids = list({it["product_id"] for it in items_res.data if it.get("product_id")})
             history_res = (
                 supabase.table("cmv_history")
                 .select("product_id, cmv_per_unit, recorded_at")
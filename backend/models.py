@@ -78,7 +78,7 @@ class Recipe(SQLModel, table=True):
     __tablename__ = "recipes"
     
     id: Optional[str] = Field(default=None, primary_key=True)
-    name: str
+    name: str = Field(index=True)
     current_cost: Decimal = Field(default=Decimal("0.00"))
     yield_units: Decimal  # How many units produced (e.g., 10 lasagnas)
     total_weight_kg: Decimal  # Total weight in kg (e.g., 12.5)
@@ -0,0 +1,108 @@
+import sys
+import os
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import main
+from main import app
+
+
+class FakeQuery:
+    """Stands in for a supabase-py query builder: filters chain, execute() returns the rows."""
+    def __init__(self, data):
+        self.data = data
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return self
+
+
+class FakeSupabase:
+    def __init__(self, tables=None, rpcs=None):
+        self.tables = tables or {}
+        self.rpcs = rpcs or {}
+
+    def table(self, name):
+        return self.tables[name]
+
+    def rpc(self, name, params=None):
+        return self.rpcs[name]
+
+
+def test_etag_keeps_content_type():
+    main.categories_cache.clear()
+    categories = FakeQuery([{"id": "1", "name": "Laticínios"}])
+    with patch.object(main, "supabase", FakeSupabase(tables={"ingredients_categories": categories})):
+        client = TestClient(app)
+        
+        res = client.get("/api/categories")
+        assert res.status_code == 200
+        assert res.headers["content-type"] == "application/json"
+        assert res.headers["etag"]
+        assert res.json() == [{"id": "1", "name": "Laticínios"}]
+        
+        res = client.get("/api/categories", headers={"If-None-Match": res.headers["etag"]})
+        assert res.status_code == 304
+        assert res.content == b""
+
+
+def assert_etag_revalidates(client, path):
+    """Unchanged body: same ETag; matching If-None-Match: empty 304."""
+    first = client.get(path)
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "application/json"
+    etag = first.headers["etag"]
+    
+    again = client.get(path)
+    assert again.status_code == 200
+    assert again.headers["etag"] == etag
+    
+    revalidated = client.get(path, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    return etag
+
+
+def test_etag_recipe_list():
+    main.recipes_cache.clear()
+    recipes = FakeQuery([{"id": "r1", "name": "Bolo"}])
+    with patch.object(main, "supabase", FakeSupabase(tables={"recipes": recipes})):
+        client = TestClient(app)
+        etag = assert_etag_revalidates(client, "/api/recipes")
+        
+        # A changed list gets a new ETag once the cache entry is gone
+        recipes.data = [{"id": "r1", "name": "Bolo de cenoura"}]
+        main.recipes_cache.clear()
+        res = client.get("/api/recipes", headers={"If-None-Match": etag})
+        assert res.status_code == 200
+        assert res.headers["etag"] != etag
+
+
+def test_etag_anvisa_label():
+    main.recipes_cache.clear()
+    recipe = FakeQuery({
+        "name": "Bolo",
+        "yield_units": 1,
+        "production_unit": "KG",
+        "recipe_categories": {"name": "Bolos", "anvisa_portion_g": 60}
+    })
+    totals = FakeQuery([{
+        "ingredient_count": 2, "linked_count": 2,
+        "energy_kcal": 3000, "carbs_g": 400, "sugars_total_g": 200, "sugars_added_g": 150,
+        "protein_g": 50, "lipid_g": 100, "saturated_fat_g": 40, "trans_fat_g": 0,
+        "fiber_g": 20, "sodium_mg": 2000
+    }])
+    fake = FakeSupabase(tables={"recipes": recipe}, rpcs={"get_recipe_anvisa_totals": totals})
+    with patch.object(main, "supabase", fake):
+        client = TestClient(app)
+        assert_etag_revalidates(client, "/api/recipes/r1/anvisa-label")
+
+
+if __name__ == "__main__":
+    test_etag_keeps_content_type()
+    test_etag_recipe_list()
+    test_etag_anvisa_label()
@@ -1,3 +1,4 @@
+import asyncio
 import sys
 import os
 import requests
@@ -14,7 +15,7 @@ def test_label():
     recipe_id = res.data[0]["id"]
     from main import get_recipe_anvisa_label
     try:
-        data = get_recipe_anvisa_label(recipe_id)
+        data = asyncio.run(get_recipe_anvisa_label(recipe_id))
         print("Label data keys:", data.keys() if isinstance(data, dict) else "Not a dict")
         print("Nutrients keys:", data.get("nutrients", {}).keys() if isinstance(data, dict) else "none")
     except Exception as e:
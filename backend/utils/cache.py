@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache whose entries expire after `ttl` seconds.
+    """
+    def __init__(self, maxsize: int = 1000, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size, for tuning maxsize/ttl."""
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def cached(cache: TTLCache):
+    """
+    Cache a function's return value keyed by its arguments.
+    Works for both plain and async functions. Exceptions are not cached.
+    """
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = (func.__name__, args, tuple(sorted(kwargs.items())))
+                value = cache.get(key, MISSING)
+                if value is MISSING:
+                    value = await func(*args, **kwargs)
+                    cache.set(key, value)
+                return value
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__name__, args, tuple(sorted(kwargs.items())))
+            value = cache.get(key, MISSING)
+            if value is MISSING:
+                value = func(*args, **kwargs)
+                cache.set(key, value)
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,64 @@
+import random
+import time
+import urllib.request
+from typing import Optional
+
+import httpx
+
+
+# Gateway errors are only retried for reads; a write may already have been applied
+RETRY_STATUS_ANY = {429}
+RETRY_STATUS_IDEMPOTENT = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class RetryTransport(httpx.HTTPTransport):
+    """
+    HTTP transport that retries rate-limited (429) responses, and transient
+    gateway errors on reads, with exponential backoff and jitter, honouring
+    Retry-After when the server sends it.
+    A 429 means the request was not processed, so retrying is safe for writes too.
+    """
+    def __init__(self, *args, max_attempts: int = 3, initial_delay: float = 0.25, max_delay: float = 4.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_attempts = max_attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+
+    def _delay(self, response: httpx.Response, attempt: int) -> float:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_delay)
+            except ValueError:
+                pass
+        backoff = min(self.initial_delay * (2 ** (attempt - 1)), self.max_delay)
+        return backoff + random.uniform(0, backoff)
+
+    def _should_retry(self, request: httpx.Request, response: httpx.Response) -> bool:
+        if response.status_code in RETRY_STATUS_ANY:
+            return True
+        return response.status_code in RETRY_STATUS_IDEMPOTENT and request.method in IDEMPOTENT_METHODS
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 1
+        while True:
+            response = super().handle_request(request)
+            if not self._should_retry(request, response) or attempt >= self.max_attempts:
+                return response
+            delay = self._delay(response, attempt)
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+
+def environment_proxy(url: httpx.URL) -> Optional[str]:
+    """
+    Proxy an httpx client would take from the environment for url
+    (HTTPS_PROXY / ALL_PROXY, honouring NO_PROXY). httpx skips environment
+    proxies when a custom transport is given, so it is set on the transport.
+    """
+    if urllib.request.proxy_bypass(url.host):
+        return None
+    proxies = urllib.request.getproxies()
+    return proxies.get(url.scheme) or proxies.get("all")
@@ -1,7 +1,8 @@
 import logging
 import sys
-import json
-from datetime import datetime
+import time
+
+import orjson
 
 class JsonFormatter(logging.Formatter):
     """
@@ -9,7 +10,8 @@ class JsonFormatter(logging.Formatter):
     """
     def format(self, record):
         log_record = {
-            "timestamp": datetime.utcnow().isoformat(),
+            # record.created is set by logging itself; no extra clock read or datetime object
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + ".%03d" % record.msecs,
             "level": record.levelname,
             "message": record.getMessage(),
             "module": record.module,
@@ -18,10 +20,11 @@ class JsonFormatter(logging.Formatter):
         }
         
         # Add extra fields if available
-        if hasattr(record, "props"):
-            log_record.update(record.props)
+        props = getattr(record, "props", None)
+        if props:
+            log_record.update(props)
             
-        return json.dumps(log_record)
+        return orjson.dumps(log_record).decode()
 
 def setup_logger(name: str = "radar_api", level: int = logging.INFO):
     """
@@ -0,0 +1,19 @@
+-- Batched product_map lookup for receipt uploads.
+-- Replaces one ILIKE round-trip per receipt item with a single call that
+-- returns the best match (if any) for every name in the input array.
+
+CREATE OR REPLACE FUNCTION public.match_product_map(p_names text[])
+ RETURNS TABLE(query_name text, ingredient_id uuid, ingredient_name text, category text)
+ LANGUAGE sql
+ STABLE
+AS $function$
+    SELECT q.name, m.ingredient_id, m.ingredient_name, m.category
+    FROM unnest(p_names) AS q(name)
+    CROSS JOIN LATERAL (
+        SELECT pm.ingredient_id, i.name AS ingredient_name, i.category
+        FROM public.product_map pm
+        JOIN public.ingredients i ON i.id = pm.ingredient_id
+        WHERE pm.raw_name ILIKE '%' || q.name || '%'
+        LIMIT 1
+    ) m;
+$function$;
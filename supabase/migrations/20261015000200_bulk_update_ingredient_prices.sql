@@ -0,0 +1,14 @@
+-- Bulk price update used by receipt validation.
+-- Expects a JSON array of {"id": uuid, "price": numeric} objects and updates
+-- every ingredient in a single statement.
+
+CREATE OR REPLACE FUNCTION public.bulk_update_ingredient_prices(p_items jsonb)
+ RETURNS void
+ LANGUAGE sql
+AS $function$
+    UPDATE public.ingredients AS i
+    SET current_price = v.price,
+        last_updated = now()
+    FROM jsonb_to_recordset(p_items) AS v(id uuid, price numeric)
+    WHERE i.id = v.id;
+$function$;
@@ -0,0 +1,24 @@
+-- Trigram indexes for substring (ILIKE '%...%') searches.
+-- A b-tree index cannot serve a leading-wildcard pattern; gin_trgm_ops can,
+-- and it supports ILIKE directly on the column (no lower() needed).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_ingredients_name_trgm
+    ON public.ingredients USING GIN (name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_product_map_raw_name_trgm
+    ON public.product_map USING GIN (raw_name gin_trgm_ops);
+
+-- Ingredient search used by GET /api/ingredients?search=
+-- Best matches first, alphabetical among equally similar names.
+CREATE OR REPLACE FUNCTION public.search_ingredients(q text)
+ RETURNS SETOF public.ingredients
+ LANGUAGE sql
+ STABLE
+AS $function$
+    SELECT *
+    FROM public.ingredients
+    WHERE name ILIKE '%' || q || '%'
+    ORDER BY similarity(name, q) DESC, name;
+$function$;
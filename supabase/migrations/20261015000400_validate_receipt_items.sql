@@ -0,0 +1,58 @@
+-- Receipt validation in a single round-trip.
+-- p_items is a JSON array of {"receipt_item_id", "ingredient_id", "price"}.
+-- In one transaction this:
+--   1. upserts the raw_name -> ingredient mapping in product_map (learning)
+--   2. updates ingredient prices (last price wins for repeated ingredients)
+--   3. marks the receipt as verified
+-- and returns one row per updated ingredient with its old price and the price
+-- actually written, so alerts can be raised by the caller.
+-- Items whose receipt_item or ingredient does not exist are skipped.
+
+CREATE OR REPLACE FUNCTION public.validate_receipt_items(p_receipt_id uuid, p_items jsonb)
+ RETURNS TABLE(ingredient_id uuid, ingredient_name text, old_price numeric, new_price numeric)
+ LANGUAGE sql
+AS $function$
+    INSERT INTO public.product_map (raw_name, ingredient_id, confidence)
+    SELECT DISTINCT ri.raw_name, i.id, 1.0
+    FROM jsonb_array_elements(p_items) AS e(item)
+    JOIN public.receipt_items ri ON ri.id = (e.item->>'receipt_item_id')::uuid
+    JOIN public.ingredients i ON i.id = (e.item->>'ingredient_id')::uuid
+    ON CONFLICT (raw_name, ingredient_id) DO UPDATE SET confidence = EXCLUDED.confidence;
+
+    UPDATE public.receipts SET status = 'verified' WHERE id = p_receipt_id;
+
+    WITH valid AS (
+        SELECT (e.item->>'ingredient_id')::uuid AS ingredient_id,
+               (e.item->>'price')::numeric AS price,
+               e.ord
+        FROM jsonb_array_elements(p_items) WITH ORDINALITY AS e(item, ord)
+        JOIN public.receipt_items ri ON ri.id = (e.item->>'receipt_item_id')::uuid
+    ),
+    latest AS (
+        SELECT DISTINCT ON (v.ingredient_id) v.ingredient_id, v.price, v.ord
+        FROM valid v
+        ORDER BY v.ingredient_id, v.ord DESC
+    ),
+    previous AS (
+        -- All sub-statements share one snapshot, so this reads pre-update prices
+        SELECT i.id, i.current_price
+        FROM public.ingredients i
+        JOIN latest l ON l.ingredient_id = i.id
+    ),
+    updated AS (
+        UPDATE public.ingredients i
+        SET current_price = l.price,
+            last_updated = now()
+        FROM latest l
+        WHERE i.id = l.ingredient_id
+        RETURNING i.id, i.name
+    )
+    SELECT l.ingredient_id, u.name, p.current_price, l.price
+    FROM latest l
+    JOIN updated u ON u.id = l.ingredient_id
+    JOIN previous p ON p.id = l.ingredient_id
+    ORDER BY l.ord;
+$function$;
+
+-- Superseded by validate_receipt_items
+DROP FUNCTION IF EXISTS public.bulk_update_ingredient_prices(jsonb);
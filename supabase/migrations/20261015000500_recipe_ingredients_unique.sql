@@ -0,0 +1,25 @@
+-- One row per (recipe, ingredient) so recipe updates can upsert instead of
+-- delete + re-insert. Existing duplicates are merged by summing quantities,
+-- which keeps recipe cost and nutrition unchanged (both are linear in quantity).
+
+WITH merged AS (
+    SELECT recipe_id, ingredient_id, SUM(quantity) AS quantity, MIN(id::text)::uuid AS keep_id
+    FROM public.recipe_ingredients
+    GROUP BY recipe_id, ingredient_id
+    HAVING COUNT(*) > 1
+),
+updated AS (
+    UPDATE public.recipe_ingredients ri
+    SET quantity = m.quantity
+    FROM merged m
+    WHERE ri.id = m.keep_id
+    RETURNING ri.id
+)
+DELETE FROM public.recipe_ingredients ri
+USING merged m
+WHERE ri.recipe_id = m.recipe_id
+  AND ri.ingredient_id = m.ingredient_id
+  AND ri.id <> m.keep_id;
+
+ALTER TABLE public.recipe_ingredients
+    ADD CONSTRAINT recipe_ingredients_recipe_id_ingredient_id_key UNIQUE (recipe_id, ingredient_id);
@@ -0,0 +1,9 @@
+-- Cheap liveness probe for GET /api/health (no table scan, no RLS evaluation).
+
+CREATE OR REPLACE FUNCTION public.ping()
+ RETURNS integer
+ LANGUAGE sql
+ STABLE
+AS $function$
+    SELECT 1;
+$function$;
@@ -0,0 +1,13 @@
+-- Ingredients missing category or unit (GET /api/ingredients/pending).
+-- A partial index keeps the lookup proportional to the number of pending rows,
+-- and the view replaces the OR filter string built by the API.
+
+CREATE INDEX IF NOT EXISTS idx_ingredients_pending
+    ON public.ingredients (name)
+    WHERE category IS NULL OR category = '' OR unit IS NULL OR unit = '';
+
+CREATE OR REPLACE VIEW public.pending_ingredients
+WITH (security_invoker = true) AS
+    SELECT *
+    FROM public.ingredients
+    WHERE category IS NULL OR category = '' OR unit IS NULL OR unit = '';
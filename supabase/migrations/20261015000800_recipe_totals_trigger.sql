@@ -0,0 +1,93 @@
+-- Recipe cost aggregates maintained by the database.
+-- Same rules as calculate_recipe_totals in the API:
+--   effective price = current_price / yield_coefficient (when yield_coefficient > 0)
+--   EMBALAGEM categories count as packaging and are excluded from the weight
+--   current_cost = ingredients_cost + packaging_cost + labor_cost
+-- cmv_per_unit / cmv_per_kg remain generated columns derived from these.
+
+CREATE OR REPLACE FUNCTION public.recompute_recipe_totals(p_recipe_ids uuid[])
+ RETURNS void
+ LANGUAGE sql
+AS $function$
+    WITH totals AS (
+        SELECT r.id AS recipe_id,
+               COALESCE(SUM(c.item_cost) FILTER (WHERE NOT c.is_packaging), 0) AS ingredients_cost,
+               COALESCE(SUM(c.item_cost) FILTER (WHERE c.is_packaging), 0) AS packaging_cost,
+               COALESCE(SUM(c.quantity) FILTER (WHERE NOT c.is_packaging), 0) AS total_weight_kg
+        FROM unnest(p_recipe_ids) AS r(id)
+        LEFT JOIN LATERAL (
+            SELECT ri.quantity,
+                   ri.quantity * CASE WHEN COALESCE(i.yield_coefficient, 1) > 0
+                                      THEN COALESCE(i.current_price, 0) / COALESCE(i.yield_coefficient, 1)
+                                      ELSE COALESCE(i.current_price, 0) END AS item_cost,
+                   COALESCE(upper(i.category) LIKE '%EMBALAGEM%', false) AS is_packaging
+            FROM public.recipe_ingredients ri
+            JOIN public.ingredients i ON i.id = ri.ingredient_id
+            WHERE ri.recipe_id = r.id
+        ) c ON true
+        GROUP BY r.id
+    )
+    UPDATE public.recipes rec
+    SET ingredients_cost = t.ingredients_cost,
+        packaging_cost = t.packaging_cost,
+        total_weight_kg = t.total_weight_kg,
+        last_calculated = now()
+    FROM totals t
+    WHERE rec.id = t.recipe_id;
+$function$;
+
+-- current_cost always follows its components (labor_cost may change without ingredient changes)
+CREATE OR REPLACE FUNCTION public.fn_recipes_current_cost()
+ RETURNS trigger
+ LANGUAGE plpgsql
+AS $function$
+BEGIN
+    NEW.current_cost := COALESCE(NEW.ingredients_cost, 0)
+                      + COALESCE(NEW.packaging_cost, 0)
+                      + COALESCE(NEW.labor_cost, 0);
+    RETURN NEW;
+END;
+$function$;
+
+DROP TRIGGER IF EXISTS trg_recipes_current_cost ON public.recipes;
+CREATE TRIGGER trg_recipes_current_cost
+    BEFORE INSERT OR UPDATE OF ingredients_cost, packaging_cost, labor_cost, current_cost ON public.recipes
+    FOR EACH ROW EXECUTE FUNCTION public.fn_recipes_current_cost();
+
+-- Recompute once per statement for every recipe touched by the change
+CREATE OR REPLACE FUNCTION public.fn_recipe_ingredients_recompute()
+ RETURNS trigger
+ LANGUAGE plpgsql
+AS $function$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM public.recompute_recipe_totals(ARRAY(SELECT DISTINCT recipe_id FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM public.recompute_recipe_totals(ARRAY(SELECT DISTINCT recipe_id FROM old_rows));
+    ELSE
+        PERFORM public.recompute_recipe_totals(ARRAY(
+            SELECT recipe_id FROM new_rows UNION SELECT recipe_id FROM old_rows
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$function$;
+
+-- Transition tables require one trigger per event
+DROP TRIGGER IF EXISTS trg_recipe_ingredients_recompute_ins ON public.recipe_ingredients;
+CREATE TRIGGER trg_recipe_ingredients_recompute_ins
+    AFTER INSERT ON public.recipe_ingredients
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.fn_recipe_ingredients_recompute();
+
+DROP TRIGGER IF EXISTS trg_recipe_ingredients_recompute_upd ON public.recipe_ingredients;
+CREATE TRIGGER trg_recipe_ingredients_recompute_upd
+    AFTER UPDATE ON public.recipe_ingredients
+    REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.fn_recipe_ingredients_recompute();
+
+DROP TRIGGER IF EXISTS trg_recipe_ingredients_recompute_del ON public.recipe_ingredients;
+CREATE TRIGGER trg_recipe_ingredients_recompute_del
+    AFTER DELETE ON public.recipe_ingredients
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.fn_recipe_ingredients_recompute();
@@ -0,0 +1,7 @@
+-- Deleting a recipe removes its ingredient rows in the same statement.
+-- Recreated explicitly since older databases may predate the CASCADE in supabase_setup.sql.
+
+ALTER TABLE public.recipe_ingredients
+    DROP CONSTRAINT IF EXISTS recipe_ingredients_recipe_id_fkey,
+    ADD CONSTRAINT recipe_ingredients_recipe_id_fkey
+        FOREIGN KEY (recipe_id) REFERENCES public.recipes(id) ON DELETE CASCADE;
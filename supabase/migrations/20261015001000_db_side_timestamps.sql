@@ -0,0 +1,65 @@
+-- Timestamps stamped by the database instead of the API.
+
+-- ingredients.last_updated tracks price changes
+ALTER TABLE public.ingredients ALTER COLUMN last_updated SET DEFAULT now();
+
+CREATE OR REPLACE FUNCTION public.fn_ingredients_last_updated()
+ RETURNS trigger
+ LANGUAGE plpgsql
+AS $function$
+BEGIN
+    IF NEW.current_price IS DISTINCT FROM OLD.current_price THEN
+        NEW.last_updated := now();
+    END IF;
+    RETURN NEW;
+END;
+$function$;
+
+DROP TRIGGER IF EXISTS trg_ingredients_last_updated ON public.ingredients;
+CREATE TRIGGER trg_ingredients_last_updated
+    BEFORE UPDATE OF current_price ON public.ingredients
+    FOR EACH ROW EXECUTE FUNCTION public.fn_ingredients_last_updated();
+
+-- recipes.last_calculated follows every cost write.
+-- Replaces fn_recipes_current_cost from 20261015000800_recipe_totals_trigger.sql,
+-- so this migration must keep a later timestamp than that one.
+ALTER TABLE public.recipes ALTER COLUMN last_calculated SET DEFAULT now();
+
+CREATE OR REPLACE FUNCTION public.fn_recipes_current_cost()
+ RETURNS trigger
+ LANGUAGE plpgsql
+AS $function$
+BEGIN
+    NEW.current_cost := COALESCE(NEW.ingredients_cost, 0)
+                      + COALESCE(NEW.packaging_cost, 0)
+                      + COALESCE(NEW.labor_cost, 0);
+    NEW.last_calculated := now();
+    RETURN NEW;
+END;
+$function$;
+
+-- updated_at on tables edited through the API
+CREATE OR REPLACE FUNCTION public.fn_set_updated_at()
+ RETURNS trigger
+ LANGUAGE plpgsql
+AS $function$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$function$;
+
+DROP TRIGGER IF EXISTS trg_production_processes_updated_at ON public.production_processes;
+CREATE TRIGGER trg_production_processes_updated_at
+    BEFORE UPDATE ON public.production_processes
+    FOR EACH ROW EXECUTE FUNCTION public.fn_set_updated_at();
+
+DROP TRIGGER IF EXISTS trg_production_schedule_updated_at ON public.production_schedule;
+CREATE TRIGGER trg_production_schedule_updated_at
+    BEFORE UPDATE ON public.production_schedule
+    FOR EACH ROW EXECUTE FUNCTION public.fn_set_updated_at();
+
+DROP TRIGGER IF EXISTS trg_integration_settings_updated_at ON public.integration_settings;
+CREATE TRIGGER trg_integration_settings_updated_at
+    BEFORE INSERT OR UPDATE ON public.integration_settings
+    FOR EACH ROW EXECUTE FUNCTION public.fn_set_updated_at();
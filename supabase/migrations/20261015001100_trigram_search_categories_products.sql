@@ -0,0 +1,11 @@
+-- Trigram indexes for the remaining ILIKE '%...%' searches
+-- (GET /api/categories?search= and GET /api/products?search=).
+-- pg_trgm is enabled by 20261015000300_trigram_search.sql.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_ingredients_categories_name_trgm
+    ON public.ingredients_categories USING GIN (name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_products_product_trgm
+    ON public.products USING GIN (product gin_trgm_ops);
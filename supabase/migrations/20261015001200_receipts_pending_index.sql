@@ -0,0 +1,11 @@
+-- GET /api/receipts/pending filters on status and pages by created_at DESC.
+-- A partial index keeps it small (verified receipts are the bulk of the table)
+-- and serves the ORDER BY + LIMIT without a sort.
+
+CREATE INDEX IF NOT EXISTS idx_receipts_pending_created_at
+    ON public.receipts (created_at DESC)
+    WHERE status = 'pending_validation';
+
+-- receipt_items are embedded per receipt
+CREATE INDEX IF NOT EXISTS idx_receipt_items_receipt_id
+    ON public.receipt_items (receipt_id);
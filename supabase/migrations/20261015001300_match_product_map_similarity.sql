@@ -0,0 +1,29 @@
+-- Rank product_map matches by trigram similarity.
+-- Previously the first ILIKE '%name%' hit was returned in arbitrary order.
+-- Candidates are now substring hits plus trigram-similar names (pg_trgm's %
+-- operator, default threshold 0.3); the most similar one wins. Both conditions
+-- are served by idx_product_map_raw_name_trgm.
+
+-- similarity() and % are checked when the function is created
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+DROP FUNCTION IF EXISTS public.match_product_map(text[]);
+
+CREATE FUNCTION public.match_product_map(p_names text[])
+ RETURNS TABLE(query_name text, ingredient_id uuid, ingredient_name text, category text, score real)
+ LANGUAGE sql
+ STABLE
+AS $function$
+    SELECT q.name, m.ingredient_id, m.ingredient_name, m.category, m.score
+    FROM unnest(p_names) AS q(name)
+    CROSS JOIN LATERAL (
+        SELECT pm.ingredient_id, i.name AS ingredient_name, i.category,
+               similarity(pm.raw_name, q.name) AS score
+        FROM public.product_map pm
+        JOIN public.ingredients i ON i.id = pm.ingredient_id
+        WHERE pm.raw_name ILIKE '%' || q.name || '%'
+           OR pm.raw_name % q.name
+        ORDER BY score DESC, pm.confidence DESC NULLS LAST
+        LIMIT 1
+    ) m;
+$function$;
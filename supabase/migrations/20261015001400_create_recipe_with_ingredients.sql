@@ -0,0 +1,31 @@
+-- Create a recipe and its ingredients in one round-trip and one transaction.
+-- p_recipe carries the recipes columns sent by POST /api/recipes; p_ingredients is a
+-- JSON array of {"ingredient_id", "quantity"} (already merged per ingredient).
+-- The recipe_ingredients trigger fills in the cost aggregates before the row is
+-- returned, so the caller gets the final costs instead of the pre-trigger insert.
+
+CREATE OR REPLACE FUNCTION public.create_recipe_with_ingredients(p_recipe jsonb, p_ingredients jsonb)
+ RETURNS SETOF public.recipes
+ LANGUAGE plpgsql
+AS $function$
+DECLARE
+    v_recipe_id uuid;
+BEGIN
+    INSERT INTO public.recipes (
+        name, yield_units, labor_minutes, labor_cost, sku, product_id, total_weight_kg,
+        is_pre_preparo, category_id, derived_ingredient_id, production_unit, net_weight,
+        sauce_yield_kg, status
+    )
+    SELECT r.name, r.yield_units, r.labor_minutes, r.labor_cost, r.sku, r.product_id, r.total_weight_kg,
+           r.is_pre_preparo, r.category_id, r.derived_ingredient_id, r.production_unit, r.net_weight,
+           r.sauce_yield_kg, r.status
+    FROM jsonb_populate_record(NULL::public.recipes, p_recipe) AS r
+    RETURNING id INTO v_recipe_id;
+
+    INSERT INTO public.recipe_ingredients (recipe_id, ingredient_id, quantity)
+    SELECT v_recipe_id, i.ingredient_id, i.quantity
+    FROM jsonb_to_recordset(p_ingredients) AS i(ingredient_id uuid, quantity numeric);
+
+    RETURN QUERY SELECT * FROM public.recipes WHERE id = v_recipe_id;
+END;
+$function$;
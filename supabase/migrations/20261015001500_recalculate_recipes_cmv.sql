@@ -0,0 +1,41 @@
+-- Set-based recipe CMV recalculation for every recipe affected by a price change.
+-- Replaces one read/update/insert cycle per recipe with a single call that:
+--   1. applies the global labor rate (integration_settings app_config) to labor_minutes
+--   2. refreshes ingredient/packaging totals via recompute_recipe_totals
+--      (trg_recipes_current_cost keeps current_cost in sync)
+--   3. logs one cmv_history snapshot per recipe
+-- and returns the new cost per recipe; cmv_per_unit / cmv_per_kg are generated columns.
+
+CREATE OR REPLACE FUNCTION public.recalculate_recipes_cmv(p_recipe_ids uuid[])
+ RETURNS TABLE(recipe_id uuid, current_cost numeric, cmv_per_unit numeric, cmv_per_kg numeric)
+ LANGUAGE plpgsql
+AS $function$
+DECLARE
+    v_labor_rate numeric;
+BEGIN
+    SELECT COALESCE((s.settings->>'global_labor_rate')::numeric, 17.95)
+    INTO v_labor_rate
+    FROM public.integration_settings s
+    WHERE s.service_name = 'app_config'
+    LIMIT 1;
+    v_labor_rate := COALESCE(v_labor_rate, 17.95);
+
+    UPDATE public.recipes r
+    SET labor_cost = round(COALESCE(r.labor_minutes, 0) / 60 * v_labor_rate, 2)
+    WHERE r.id = ANY(p_recipe_ids);
+
+    PERFORM public.recompute_recipe_totals(p_recipe_ids);
+
+    INSERT INTO public.cmv_history (recipe_id, product_id, cost, ingredients_cost, packaging_cost,
+                                    labor_cost, labor_rate_applied, yield_units, cmv_per_unit)
+    SELECT r.id, r.product_id, r.current_cost, r.ingredients_cost, r.packaging_cost,
+           r.labor_cost, v_labor_rate, COALESCE(r.yield_units, 1), COALESCE(r.cmv_per_unit, 0)
+    FROM public.recipes r
+    WHERE r.id = ANY(p_recipe_ids);
+
+    RETURN QUERY
+    SELECT r.id, r.current_cost, r.cmv_per_unit, r.cmv_per_kg
+    FROM public.recipes r
+    WHERE r.id = ANY(p_recipe_ids);
+END;
+$function$;
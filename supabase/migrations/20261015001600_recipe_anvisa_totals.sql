@@ -0,0 +1,41 @@
+-- Batch nutrient totals for the ANVISA label, aggregated in the database.
+-- nutritional_ref values are per 100 g and recipe quantities are in kg,
+-- so each ingredient contributes quantity * 1000 / 100 times its reference values.
+-- Always returns exactly one row; ingredient_count = 0 means the recipe has no
+-- ingredients and linked_count = 0 means none of them has nutritional data.
+
+CREATE OR REPLACE FUNCTION public.get_recipe_anvisa_totals(p_recipe_id uuid)
+ RETURNS TABLE(
+    ingredient_count integer,
+    linked_count integer,
+    energy_kcal numeric,
+    carbs_g numeric,
+    sugars_total_g numeric,
+    sugars_added_g numeric,
+    protein_g numeric,
+    lipid_g numeric,
+    saturated_fat_g numeric,
+    trans_fat_g numeric,
+    fiber_g numeric,
+    sodium_mg numeric
+ )
+ LANGUAGE sql
+ STABLE
+AS $function$
+    SELECT COUNT(*)::integer,
+           COUNT(n.id)::integer,
+           COALESCE(SUM(ri.quantity * 10 * n.energy_kcal), 0),
+           COALESCE(SUM(ri.quantity * 10 * n.carbs_g), 0),
+           COALESCE(SUM(ri.quantity * 10 * n.sugars_total_g), 0),
+           COALESCE(SUM(ri.quantity * 10 * n.sugars_added_g), 0),
+           COALESCE(SUM(ri.quantity * 10 * n.protein_g), 0),
+           COALESCE(SUM(ri.quantity * 10 * n.lipid_g), 0),
+           COALESCE(SUM(ri.quantity * 10 * n.saturated_fat_g), 0),
+           COALESCE(SUM(ri.quantity * 10 * n.trans_fat_g), 0),
+           COALESCE(SUM(ri.quantity * 10 * n.fiber_g), 0),
+           COALESCE(SUM(ri.quantity * 10 * n.sodium_mg), 0)
+    FROM public.recipe_ingredients ri
+    JOIN public.ingredients i ON i.id = ri.ingredient_id
+    LEFT JOIN public.nutritional_ref n ON n.id = i.nutritional_ref_id
+    WHERE ri.recipe_id = p_recipe_id;
+$function$;
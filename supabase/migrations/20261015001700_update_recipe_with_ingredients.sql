@@ -0,0 +1,52 @@
+-- Update a recipe and sync its ingredients in one round-trip and one transaction.
+-- p_recipe carries the recipes columns sent by PUT /api/recipes/{id}; a null
+-- derived_ingredient_id keeps the current one. p_ingredients is a JSON array of
+-- {"ingredient_id", "quantity"} (already merged per ingredient): unchanged rows are
+-- left alone, changed ones upserted and missing ones deleted.
+-- Totals are refreshed at the end so they also follow current ingredient prices
+-- when no ingredient row changed.
+
+CREATE OR REPLACE FUNCTION public.update_recipe_with_ingredients(p_recipe_id uuid, p_recipe jsonb, p_ingredients jsonb)
+ RETURNS SETOF public.recipes
+ LANGUAGE plpgsql
+AS $function$
+BEGIN
+    UPDATE public.recipes rec
+    SET name = r.name,
+        yield_units = r.yield_units,
+        labor_minutes = r.labor_minutes,
+        labor_cost = r.labor_cost,
+        sku = r.sku,
+        product_id = r.product_id,
+        is_pre_preparo = r.is_pre_preparo,
+        category_id = r.category_id,
+        derived_ingredient_id = COALESCE(r.derived_ingredient_id, rec.derived_ingredient_id),
+        production_unit = r.production_unit,
+        net_weight = r.net_weight,
+        status = r.status
+    FROM jsonb_populate_record(NULL::public.recipes, p_recipe) AS r
+    WHERE rec.id = p_recipe_id;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Recipe % not found', p_recipe_id;
+    END IF;
+
+    DELETE FROM public.recipe_ingredients ri
+    WHERE ri.recipe_id = p_recipe_id
+      AND ri.ingredient_id NOT IN (
+          SELECT i.ingredient_id
+          FROM jsonb_to_recordset(p_ingredients) AS i(ingredient_id uuid, quantity numeric)
+      );
+
+    INSERT INTO public.recipe_ingredients (recipe_id, ingredient_id, quantity)
+    SELECT p_recipe_id, i.ingredient_id, i.quantity
+    FROM jsonb_to_recordset(p_ingredients) AS i(ingredient_id uuid, quantity numeric)
+    ON CONFLICT (recipe_id, ingredient_id) DO UPDATE
+        SET quantity = EXCLUDED.quantity
+        WHERE recipe_ingredients.quantity IS DISTINCT FROM EXCLUDED.quantity;
+
+    PERFORM public.recompute_recipe_totals(ARRAY[p_recipe_id]);
+
+    RETURN QUERY SELECT * FROM public.recipes WHERE id = p_recipe_id;
+END;
+$function$;
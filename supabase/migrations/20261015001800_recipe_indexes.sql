@@ -0,0 +1,8 @@
+-- recalculate_affected_recipes looks up recipe_ingredients by ingredient_id; the
+-- (recipe_id, ingredient_id) unique index only serves lookups by recipe_id.
+CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_ingredient_id
+    ON public.recipe_ingredients (ingredient_id);
+
+-- GET /api/recipes lists recipes ordered by name
+CREATE INDEX IF NOT EXISTS idx_recipes_name
+    ON public.recipes (name);
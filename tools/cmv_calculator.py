@@ -3,11 +3,22 @@
 CMV Calculator - Recalculate recipe costs based on ingredient prices.
 """
 
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Optional
 from decimal import Decimal
+import anyio
 from supabase import Client
 
 
+@lru_cache(maxsize=256)
+def is_packaging_category(category: Optional[str]) -> bool:
+    """
+    Packaging items count towards packaging cost and not towards recipe weight.
+    Memoized: there are only a handful of distinct category strings.
+    """
+    return bool(category) and 'EMBALAGEM' in category.upper()
+
+
 async def recalculate_recipe_cost(
     recipe_id: str,
     supabase: Client
@@ -15,11 +26,9 @@ async def recalculate_recipe_cost(
     """
     Recalculate cost of a single recipe.
     
-    Steps:
-    1. Fetch all ingredients for the recipe
-    2. Sum (quantity * current_price) for each ingredient
-    3. Update recipe.current_cost
-    4. Log to cmv_history
+    The recalculation runs in the database (recalculate_recipes_cmv):
+    labor cost from the global rate, ingredient/packaging totals,
+    current_cost and a cmv_history snapshot, in one transaction.
     
     Returns:
         {
@@ -29,97 +38,31 @@ async def recalculate_recipe_cost(
             "cmv_per_kg": Decimal
         }
     """
-    # Get recipe details
-    recipe_response = supabase.table("recipes").select("*").eq("id", recipe_id).execute()
-    if not recipe_response.data:
+    results = await recalculate_recipes([recipe_id], supabase)
+    if not results:
         raise ValueError(f"Recipe {recipe_id} not found")
     
-    recipe = recipe_response.data[0]
-    
-    # Get recipe ingredients with current prices, yields and categories
-    ingredients_response = supabase.table("recipe_ingredients") \
-        .select("ingredient_id, quantity, ingredients(current_price, yield_coefficient, category)") \
-        .eq("recipe_id", recipe_id) \
-        .execute()
-    
-    # Calculate totals
-    total_batch_ingredients_cost = Decimal("0.00")
-    total_batch_packaging_cost = Decimal("0.00")
-    total_weight = Decimal("0.00")
-    
-    for item in ingredients_response.data:
-        qty = Decimal(str(item["quantity"]))
-        
-        # Get ingredient data with fallbacks
-        ing_data = item.get("ingredients") or {}
-        price = Decimal(str(ing_data.get("current_price", 0)))
-        yield_coeff = Decimal(str(ing_data.get("yield_coefficient", 1)))
-        category = ing_data.get("category", "")
-        
-        if yield_coeff > 0:
-            effective_price = price / yield_coeff
-        else:
-            effective_price = price
+    return results[0]
 
-        item_cost = effective_price * qty
-        
-        if category and 'EMBALAGEM' in category.upper():
-            total_batch_packaging_cost += item_cost
-        else:
-            total_batch_ingredients_cost += item_cost
-            total_weight += qty
-            
-    # Fetch global labor rate from app_config
-    config_response = supabase.table("integration_settings") \
-        .select("settings") \
-        .eq("service_name", "app_config") \
-        .execute()
-    
-    global_labor_rate = Decimal("17.95") # Fallback
-    if config_response.data:
-        global_labor_rate = Decimal(str(config_response.data[0]["settings"].get("global_labor_rate", "17.95")))
 
-    # Recalculate labor cost based on minutes and global rate
-    labor_minutes = Decimal(str(recipe.get("labor_minutes", 0)))
-    labor_cost = (labor_minutes / Decimal("60")) * global_labor_rate
-    labor_cost = labor_cost.quantize(Decimal("0.01"))
-    
-    total_cost = total_batch_ingredients_cost + total_batch_packaging_cost + labor_cost
-    
-    # Update recipe
-    update_response = supabase.table("recipes") \
-        .update({
-            "current_cost": float(total_cost),
-            "ingredients_cost": float(total_batch_ingredients_cost),
-            "packaging_cost": float(total_batch_packaging_cost),
-            "labor_cost": float(labor_cost),
-        }) \
-        .eq("id", recipe_id) \
-        .execute()
-    
-    updated_recipe = update_response.data[0]
-    
-    labor_rate_applied = global_labor_rate
-        
-    supabase.table("cmv_history").insert({
-        "recipe_id": recipe_id,
-        "product_id": recipe.get("product_id"),
-        "cost": float(total_cost),
-        "ingredients_cost": float(total_batch_ingredients_cost),
-        "packaging_cost": float(total_batch_packaging_cost),
-        "labor_cost": float(labor_cost),
-        "labor_rate_applied": float(labor_rate_applied),
-        "yield_units": float(recipe.get("yield_units", 1)),
-        "cmv_per_unit": float(updated_recipe.get("cmv_per_unit", 0))
-    }).execute()
+async def recalculate_recipes(
+    recipe_ids: List[str],
+    supabase: Client
+) -> List[Dict]:
+    """Recalculate the given recipes in a single set-based call."""
+    response = await anyio.to_thread.run_sync(
+        supabase.rpc("recalculate_recipes_cmv", {"p_recipe_ids": recipe_ids}).execute
+    )
     
-    # CMV values are auto-calculated in DB, fetch them
-    return {
-        "recipe_id": recipe_id,
-        "new_cost": total_cost,
-        "cmv_per_unit": Decimal(str(updated_recipe.get("cmv_per_unit", 0))),
-        "cmv_per_kg": Decimal(str(updated_recipe.get("cmv_per_kg", 0)))
-    }
+    return [
+        {
+            "recipe_id": row["recipe_id"],
+            "new_cost": Decimal(str(row.get("current_cost") or 0)),
+            "cmv_per_unit": Decimal(str(row.get("cmv_per_unit") or 0)),
+            "cmv_per_kg": Decimal(str(row.get("cmv_per_kg") or 0))
+        }
+        for row in response.data
+    ]
 
 
 async def recalculate_affected_recipes(
@@ -137,21 +80,19 @@ async def recalculate_affected_recipes(
         List of recalculation results
     """
     # Find affected recipes
-    recipes_response = supabase.table("recipe_ingredients") \
-        .select("recipe_id") \
-        .in_("ingredient_id", ingredient_ids) \
-        .execute()
+    recipes_response = await anyio.to_thread.run_sync(
+        supabase.table("recipe_ingredients")
+        .select("recipe_id")
+        .in_("ingredient_id", ingredient_ids)
+        .execute
+    )
     
     # Get unique recipe IDs
-    recipe_ids = list(set([r["recipe_id"] for r in recipes_response.data]))
-    
-    # Recalculate each
-    results = []
-    for recipe_id in recipe_ids:
-        result = await recalculate_recipe_cost(recipe_id, supabase)
-        results.append(result)
+    recipe_ids = list({r["recipe_id"] for r in recipes_response.data})
+    if not recipe_ids:
+        return []
     
-    return results
+    return await recalculate_recipes(recipe_ids, supabase)
 
 
 def calculate_cmv_change_percentage(
@@ -4,6 +4,8 @@ Discord Notifier - Send alerts to Discord via webhook.
 """
 
 import os
+import threading
+import time
 import requests
 from typing import Optional
 from decimal import Decimal
@@ -12,6 +14,85 @@ from dotenv import load_dotenv
 load_dotenv()
 
 DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
+MAX_RETRIES = 3
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 5.0
+MAX_EMBEDS_PER_MESSAGE = 10  # Discord limit
+REQUEST_TIMEOUT_S = 10
+
+# Sessions keep the TLS connection to Discord alive between alerts. Alerts are
+# posted from several worker threads and requests.Session isn't thread-safe,
+# so each thread gets its own.
+thread_sessions = threading.local()
+
+
+def get_session() -> requests.Session:
+    """Return this thread's webhook session, creating it on first use."""
+    session = getattr(thread_sessions, "session", None)
+    if session is None:
+        session = thread_sessions.session = requests.Session()
+    return session
+
+
+def post_webhook(payload: dict, max_retries: int = MAX_RETRIES) -> bool:
+    """
+    Post a payload to the Discord webhook, retrying with exponential backoff
+    when rate limited (429) or on server errors.
+    
+    Returns:
+        True if sent successfully
+    """
+    for attempt in range(max_retries + 1):
+        response = get_session().post(DISCORD_WEBHOOK_URL, json=payload, timeout=REQUEST_TIMEOUT_S)
+        if response.status_code == 204:
+            return True
+        if response.status_code != 429 and response.status_code < 500:
+            return False
+        if attempt < max_retries:
+            # Discord sends retry_after (seconds) on 429
+            retry_after = None
+            if response.status_code == 429:
+                try:
+                    retry_after = float(response.json().get("retry_after"))
+                except Exception:
+                    pass
+            time.sleep(retry_after or min(BACKOFF_BASE_S * 2 ** attempt, BACKOFF_MAX_S))
+    return False
+
+
+def price_alert_embed(
+    ingredient_name: str,
+    old_price: Decimal,
+    new_price: Decimal,
+    change_percent: Decimal
+) -> dict:
+    """Build the Discord embed for a price change."""
+    # Determine emoji based on change
+    emoji = "🚨" if change_percent > 0 else "✅"
+    color = 15158332 if change_percent > 0 else 3066993  # Red or Green
+    
+    return {
+        "title": f"{emoji} Alerta de Preço: {ingredient_name}",
+        "description": f"O preço mudou **{abs(change_percent):.1f}%**",
+        "color": color,
+        "fields": [
+            {
+                "name": "Preço Anterior",
+                "value": f"R$ {old_price:.2f}",
+                "inline": True
+            },
+            {
+                "name": "Novo Preço",
+                "value": f"R$ {new_price:.2f}",
+                "inline": True
+            },
+            {
+                "name": "Variação",
+                "value": f"{'+' if change_percent > 0 else ''}{change_percent:.1f}%",
+                "inline": True
+            }
+        ]
+    }
 
 
 def send_price_alert(
@@ -32,45 +113,38 @@ def send_price_alert(
     Returns:
         True if sent successfully
     """
+    return send_price_alerts([{
+        "ingredient_name": ingredient_name,
+        "old_price": old_price,
+        "new_price": new_price,
+        "change_percent": change_percent
+    }])
+
+
+def send_price_alerts(alerts: list) -> bool:
+    """
+    Send several price change alerts, packing up to MAX_EMBEDS_PER_MESSAGE
+    embeds into each webhook message.
+    
+    Args:
+        alerts: List of dicts with send_price_alert's arguments
+        
+    Returns:
+        True if every message was sent successfully
+    """
     if not DISCORD_WEBHOOK_URL:
         print("⚠️ DISCORD_WEBHOOK_URL not configured")
         return False
     
-    # Determine emoji based on change
-    emoji = "🚨" if change_percent > 0 else "✅"
-    color = 15158332 if change_percent > 0 else 3066993  # Red or Green
-    
-    payload = {
-        "embeds": [{
-            "title": f"{emoji} Alerta de Preço: {ingredient_name}",
-            "description": f"O preço mudou **{abs(change_percent):.1f}%**",
-            "color": color,
-            "fields": [
-                {
-                    "name": "Preço Anterior",
-                    "value": f"R$ {old_price:.2f}",
-                    "inline": True
-                },
-                {
-                    "name": "Novo Preço",
-                    "value": f"R$ {new_price:.2f}",
-                    "inline": True
-                },
-                {
-                    "name": "Variação",
-                    "value": f"{'+' if change_percent > 0 else ''}{change_percent:.1f}%",
-                    "inline": True
-                }
-            ]
-        }]
-    }
-    
-    try:
-        response = requests.post(DISCORD_WEBHOOK_URL, json=payload)
-        return response.status_code == 204
-    except Exception as e:
-        print(f"Failed to send Discord alert: {e}")
-        return False
+    embeds = [price_alert_embed(**alert) for alert in alerts]
+    sent = True
+    for i in range(0, len(embeds), MAX_EMBEDS_PER_MESSAGE):
+        try:
+            sent = post_webhook({"embeds": embeds[i:i + MAX_EMBEDS_PER_MESSAGE]}) and sent
+        except Exception as e:
+            print(f"Failed to send Discord alert: {e}")
+            sent = False
+    return sent
 
 
 def send_cmv_update(
@@ -127,8 +201,7 @@ def send_cmv_update(
     }
     
     try:
-        response = requests.post(DISCORD_WEBHOOK_URL, json=payload)
-        return response.status_code == 204
+        return post_webhook(payload)
     except Exception as e:
         print(f"Failed to send Discord alert: {e}")
         return False
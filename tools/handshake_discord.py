@@ -32,7 +32,7 @@ def verify_webhook() -> bool:
             }]
         }
         
-        response = requests.post(DISCORD_WEBHOOK_URL, json=payload)
+        response = requests.post(DISCORD_WEBHOOK_URL, json=payload, timeout=10)
         
         if response.status_code == 204:
             print("✅ Discord webhook test message sent successfully!")
@@ -6,6 +6,7 @@ Tests database connectivity and verifies schema exists.
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
@@ -28,15 +29,15 @@ def verify_connection() -> bool:
         supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
         print(f"✅ Connected to: {SUPABASE_URL}")
         
-        # Test query - Check if ingredients table exists
-        response = supabase.table("ingredients").select("*").limit(1).execute()
-        print(f"✅ Table 'ingredients' exists. Rows: {len(response.data)}")
+        # Check core tables concurrently; HEAD with an exact count transfers no rows
+        tables = ["ingredients", "receipts", "receipt_items", "product_map", "recipes"]
         
-        # Check other core tables
-        tables = ["receipts", "receipt_items", "product_map", "recipes"]
-        for table in tables:
-            response = supabase.table(table).select("*").limit(1).execute()
-            print(f"✅ Table '{table}' exists. Rows: {len(response.data)}")
+        def check_table(table: str):
+            return supabase.table(table).select("*", count="exact", head=True).execute()
+        
+        with ThreadPoolExecutor(max_workers=len(tables)) as pool:
+            for table, response in zip(tables, pool.map(check_table, tables)):
+                print(f"✅ Table '{table}' exists. Rows: {response.count}")
         
         print("\n🎉 All Supabase connections verified successfully!")
         return True
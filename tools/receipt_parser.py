@@ -8,6 +8,30 @@ from typing import List, Dict, Optional
 from decimal import Decimal
 
 
+# Compiled once at import; the patterns run for every line of every receipt
+TOTAL_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"TOTAL[\s:]*R?\$?\s*([\d,\.]+)",
+        r"VALOR\s+TOTAL[\s:]*R?\$?\s*([\d,\.]+)",
+        r"R\$\s*([\d,\.]+)\s*TOTAL",
+    )
+]
+# QTY Unit x UnitPrice TotalPrice, anywhere in the line
+MULTI_LINE_ITEM_RE = re.compile(
+    r"([\d\.,]+)\s*(?:Kg|Un|Gf|L|M|PC|SC)?\s*[xX]\s*([\d\.,]+)\s+([\d\.,]+)",
+    re.IGNORECASE
+)
+SINGLE_LINE_ITEM_RE = re.compile(r"^(.+?)\s+([\d,\.]+)$")
+LEADING_CODES_RE = re.compile(r"^[\d\s\.]+")
+NOISE_PREFIX_RE = re.compile(r"^(?:RR|NE|DS|CO|CS|SE|BE)\s+", re.IGNORECASE)
+
+# Exclude common non-item lines and address parts (cleanup).
+# One case-insensitive alternation scans a line once, without an upper-cased copy.
+PASS_KEYWORDS = ["TOTAL", "SUBTOTAL", "VALOR", "PAGAMENTO", "TROCO", "DINHEIRO", "CARTAO", "CREDITO", "DEBITO", "CPF", "CNPJ", "IMPOSTO", "TRIBUTO", "CAIXA", "OPERADOR", "DATA", "HORA", "AV", "AVENIDA", "RUA", "CEP", "TEL", "TELEFONE", "LOJA", "PDV", "VENDEDOR"]
+PASS_KEYWORDS_RE = re.compile("|".join(map(re.escape, PASS_KEYWORDS)), re.IGNORECASE)
+
+
 def clean_text(text: str) -> str:
     """Remove extra whitespace and normalize."""
     return " ".join(text.split())
@@ -15,7 +39,8 @@ def clean_text(text: str) -> str:
 
 def extract_market_name(text: str) -> Optional[str]:
     """Extract market/store name (usually first few lines)."""
-    lines = text.strip().split("\n")
+    # Only the first 5 lines are looked at; don't split the rest of the text
+    lines = text.lstrip().split("\n", 5)
     if lines:
         # Usually the first non-empty line
         for line in lines[:5]:
@@ -28,14 +53,8 @@ def extract_market_name(text: str) -> Optional[str]:
 def extract_total_amount(text: str) -> Optional[Decimal]:
     """Extract total value from receipt."""
     # Common patterns: "TOTAL", "VALOR TOTAL", "R$"
-    patterns = [
-        r"TOTAL[\s:]*R?\$?\s*([\d,\.]+)",
-        r"VALOR\s+TOTAL[\s:]*R?\$?\s*([\d,\.]+)",
-        r"R\$\s*([\d,\.]+)\s*TOTAL",
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+    for pattern in TOTAL_PATTERNS:
+        match = pattern.search(text)
         if match:
             value_str = match.group(1).replace(".", "").replace(",", ".")
             try:
@@ -72,28 +91,27 @@ def extract_items(text: str) -> List[Dict]:
             
     lines = lines[start_index:]
     
-    # Exclude common non-item lines and address parts (cleanup)
-    pass_keywords = ["TOTAL", "SUBTOTAL", "VALOR", "PAGAMENTO", "TROCO", "DINHEIRO", "CARTAO", "CREDITO", "DEBITO", "CPF", "CNPJ", "IMPOSTO", "TRIBUTO", "CAIXA", "OPERADOR", "DATA", "HORA", "AV", "AVENIDA", "RUA", "CEP", "TEL", "TELEFONE", "LOJA", "PDV", "VENDEDOR"]
-    
-    for i, line in enumerate(lines):
-        clean_line = line.upper()
+    i = 0
+    n = len(lines)
+    while i < n:
+        line = lines[i]
+        i += 1
         # Skip if too short or matches keywords
-        if len(line) < 5 or any(k in clean_line for k in pass_keywords):
+        if len(line) < 5 or PASS_KEYWORDS_RE.search(line):
             continue
 
         # Strategy A: Multi-line Item (common in Brazil)
-        # Line i: Code + Name (e.g., "001 2275 MUSS LACTOPAR kg")
-        # Line i+1: Qty x Unit Price Total (e.g., "ENS 4,086 Kg x 26,90 109,91")
-        if i + 1 < len(lines):
-            next_line = lines[i+1]
+        # This line: Code + Name (e.g., "001 2275 MUSS LACTOPAR kg")
+        # Next line: Qty x Unit Price Total (e.g., "ENS 4,086 Kg x 26,90 109,91")
+        if i < n:
+            next_line = lines[i]
             
             # Pattern: [Noise] QTY Unit x UnitPrice TotalPrice
             # We search for the pattern anywhere in the line
-            multi_line_match = re.search(
-                r"([\d\.,]+)\s*(?:Kg|Un|Gf|L|M|PC|SC)?\s*[xX]\s*([\d\.,]+)\s+([\d\.,]+)",
-                next_line,
-                re.IGNORECASE
-            )
+            # (only lines with the "x" separator can match; skip the regex otherwise)
+            multi_line_match = None
+            if "x" in next_line or "X" in next_line:
+                multi_line_match = MULTI_LINE_ITEM_RE.search(next_line)
             
             if multi_line_match:
                 try:
@@ -104,11 +122,11 @@ def extract_items(text: str) -> List[Dict]:
                     qty = Decimal(qty_str)
                     unit_price = Decimal(unit_price_str)
                     
-                    # Clean the name (Line i)
+                    # Clean the name (this line)
                     # Remove leading codes (digits at start) and OCR noise (short words like 'RR', 'NE') at start
-                    clean_name = re.sub(r"^[\d\s\.]+", "", line).strip()
+                    clean_name = LEADING_CODES_RE.sub("", line).strip()
                     # Remove common OCR noise prefixes if name starts with them followed by space
-                    clean_name = re.sub(r"^(?:RR|NE|DS|CO|CS|SE|BE)\s+", "", clean_name, flags=re.IGNORECASE)
+                    clean_name = NOISE_PREFIX_RE.sub("", clean_name)
                     
                     if len(clean_name) > 3 and unit_price > 0:
                         items.append({
@@ -117,7 +135,7 @@ def extract_items(text: str) -> List[Dict]:
                             "price": unit_price # Now storing UNIT PRICE as requested
                         })
                         # Consume next line so we don't process it again
-                        lines[i+1] = "" 
+                        i += 1
                         continue
                 except:
                     pass
@@ -125,8 +143,9 @@ def extract_items(text: str) -> List[Dict]:
         # Strategy B: Single-line Item (Fallback)
         # Ex: "LEITE 5.99"
         # Only if NOT processed as multi-line
-        if line: # check if line wasn't consumed
-            match_single = re.search(r"^(.+?)\s+([\d,\.]+)$", line)
+        # The pattern needs a trailing price, so the line must end in a digit, "," or "."
+        if line[-1].isdigit() or line[-1] in ",.":
+            match_single = SINGLE_LINE_ITEM_RE.search(line)
             if match_single:
                 try:
                     name = match_single.group(1).strip()